@@ -5,6 +5,7 @@ import datetime
 import uuid
 import google.generativeai as genai
 from dotenv import load_dotenv
+from data_store import DataStore
 
 # Load environment variables
 load_dotenv()
@@ -29,21 +30,19 @@ USERS = {
     "Mal": {"password": "MMM", "workouts": []}
 }
 
+@st.cache_resource(show_spinner=False)
+def get_data_store():
+    """Load user data once per server process"""
+    return DataStore("users_data.json", "chats_data.json", "users_data.journal", USERS)
+
 # File operations
 def save_users_data():
     """Save user data to a JSON file"""
-    with open("users_data.json", "w") as f:
-        json.dump(USERS, f)
+    get_data_store().save_users()
 
 def load_users_data():
-    """Load user data from a JSON file"""
-    global USERS
-    try:
-        with open("users_data.json", "r") as f:
-            USERS = json.load(f)
-    except FileNotFoundError:
-        # If file doesn't exist, save the current data
-        save_users_data()
+    """Pick up user shards changed on disk since the last rerun"""
+    get_data_store().refresh()
 
 # Load data on startup
 try:
@@ -133,8 +132,7 @@ def save_workout(username, workout_data):
         "data": workout_data
     }
     
-    USERS[username]["workouts"].append(workout_entry)
-    save_users_data()
+    get_data_store().add_workout(username, workout_entry)
     return workout_id
 
 def login_page():
@@ -146,7 +144,7 @@ def login_page():
         submitted = st.form_submit_button("Login")
         
         if submitted:
-            if username in USERS and USERS[username]["password"] == password:
+            if get_data_store().authenticate(username, password):
                 st.session_state.logged_in = True
                 st.session_state.username = username
                 st.session_state.current_page = "home"
@@ -194,10 +192,12 @@ def home_page():
     """)
     
     # Display some workout stats
-    if len(USERS[st.session_state.username]["workouts"]) > 0:
-        st.write(f"You have {len(USERS[st.session_state.username]['workouts'])} saved workouts.")
+    store = get_data_store()
+    workout_count = store.count_workouts(st.session_state.username)
+    if workout_count > 0:
+        st.write(f"You have {workout_count} saved workouts.")
         
-        last_workout = USERS[st.session_state.username]["workouts"][-1]
+        last_workout = store.last_workout(st.session_state.username)
         st.write(f"Your last workout was on {last_workout['timestamp']}.")
 
 def generate_workout_page():
@@ -262,14 +262,13 @@ def generate_workout_page():
 def workout_history_page():
     st.title("Your Workout History")
     
-    user_workouts = USERS[st.session_state.username]["workouts"]
-    
-    if not user_workouts:
+    store = get_data_store()
+    if store.count_workouts(st.session_state.username) == 0:
         st.info("You haven't saved any workouts yet. Generate a workout to get started!")
         return
     
-    # Display workouts in reverse chronological order
-    for i, workout in enumerate(reversed(user_workouts)):
+    # Display workouts in reverse chronological order, reading each one's text as it is shown
+    for i, workout in enumerate(store.iter_workouts(st.session_state.username)):
         with st.expander(f"Workout from {workout['timestamp']}"):
             st.write(f"**Type:** {workout['data']['workout_type']}")
             st.write(f"**Muscle Groups:** {', '.join(workout['data']['muscle_group'])}")
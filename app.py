@@ -1,13 +1,29 @@
+import time
+
+# Start of this rerun, for the one-off startup timing below
+SCRIPT_STARTED = time.perf_counter()
+
 import streamlit as st
-import json
 import os
+import sys
 import datetime
 import uuid
-import google.generativeai as genai
 from dotenv import load_dotenv
-import base64
-from fpdf import FPDF
-import io
+from storage import open_storage
+from response_cache import ResponseCache, make_cache_key
+from chat_context import ChatContextManager, first_sentence
+from gemini_client import GeminiClientManager
+from single_flight import SingleFlight
+from resilience import CircuitBreaker, ResilientStreamer
+from pdf_cache import PdfCache, workout_pdf_key
+from workout_export import create_workout_pdf, create_workout_text
+from search_index import SearchIndex, date_tokens
+from startup_report import HEAVY_MODULES
+from metrics import Metrics, MetricsServer, MetricsLog, RerunProfiler, SIZE_BUCKETS
+from urllib.parse import quote
+
+# google.generativeai, fpdf and numpy (training_log, semantic_cache) are imported on first
+# use so the login page renders without waiting for them
 
 # Load environment variables
 load_dotenv()
@@ -19,65 +35,319 @@ if "GEMINI_API_KEY" not in os.environ:
 else:
     api_key = os.environ["GEMINI_API_KEY"]
 
-# Setup Gemini AI
-genai.configure(api_key=api_key)
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+
+# GEMINI_STUB=1 answers from a deterministic local stub instead of the API (benchmarks);
+# GEMINI_STUB_URL points at a shared gemini_stub_server.py instead (load tests)
+GEMINI_STUB = os.environ.get("GEMINI_STUB") == "1"
+GEMINI_STUB_URL = os.environ.get("GEMINI_STUB_URL")
+
+# Seconds a request may wait for a free slot before giving up
+GEMINI_QUEUE_TIMEOUT = float(os.environ.get("GEMINI_QUEUE_TIMEOUT", "60"))
+
+# Seconds a workout request waits for a shared in-flight response before giving up
+SINGLE_FLIGHT_TIMEOUT = float(os.environ.get("SINGLE_FLIGHT_TIMEOUT", "180"))
+
+# Gemini call resilience: an overall deadline and a time-to-first-chunk limit in seconds,
+# attempts per call for transient failures, hedging once the first chunk is slower than
+# this percentile of recent calls (off unless set), and a circuit breaker that fails fast
+# for GEMINI_BREAKER_RESET_SECONDS after GEMINI_BREAKER_FAILURES failures in a row
+GEMINI_DEADLINE = float(os.environ.get("GEMINI_DEADLINE", "120"))
+GEMINI_FIRST_CHUNK_TIMEOUT = float(os.environ.get("GEMINI_FIRST_CHUNK_TIMEOUT", "30"))
+GEMINI_MAX_ATTEMPTS = int(os.environ.get("GEMINI_MAX_ATTEMPTS", "3"))
+GEMINI_HEDGE_PERCENTILE = os.environ.get("GEMINI_HEDGE_PERCENTILE")
+GEMINI_BREAKER_FAILURES = int(os.environ.get("GEMINI_BREAKER_FAILURES", "5"))
+GEMINI_BREAKER_RESET_SECONDS = float(os.environ.get("GEMINI_BREAKER_RESET_SECONDS", "30"))
+
+@st.cache_resource(show_spinner=False)
+def get_gemini_manager():
+    """One model pool and rate limiter shared by every session on this server"""
+    return GeminiClientManager(
+        requests_per_minute=int(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "60")),
+        max_concurrency=int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4")),
+        api_key=api_key,
+        model_factory=stub_model_factory() if GEMINI_STUB or GEMINI_STUB_URL else None
+    )
+
+def stub_model_factory():
+    """Model factory for GEMINI_STUB / GEMINI_STUB_URL
+
+    The in-process stub takes latency specs (see gemini_stub.parse_latency),
+    an error rate and a quota from GEMINI_STUB_* settings.
+    """
+    if GEMINI_STUB_URL:
+        from gemini_stub_server import RemoteStubModel
+
+        return lambda model_name: RemoteStubModel(GEMINI_STUB_URL, model_name)
+
+    from gemini_stub import StubBackend, StubGenerativeModel
+
+    quota_rpm = os.environ.get("GEMINI_STUB_QUOTA_RPM")
+    backend = StubBackend(
+        first_chunk_latency=os.environ.get("GEMINI_STUB_FIRST_CHUNK_MS", ""),
+        chunk_latency=os.environ.get("GEMINI_STUB_CHUNK_MS", ""),
+        error_rate=float(os.environ.get("GEMINI_STUB_ERROR_RATE", "0")),
+        quota_rpm=int(quota_rpm) if quota_rpm else None
+    )
+    return lambda model_name: StubGenerativeModel(model_name, backend)
+
+@st.cache_resource(show_spinner=False)
+def get_gemini_streamer():
+    """Deadlines, retries, hedging and the circuit breaker, shared by every session"""
+    return ResilientStreamer(
+        deadline=GEMINI_DEADLINE,
+        first_chunk_timeout=GEMINI_FIRST_CHUNK_TIMEOUT,
+        max_attempts=GEMINI_MAX_ATTEMPTS,
+        hedge_percentile=float(GEMINI_HEDGE_PERCENTILE) if GEMINI_HEDGE_PERCENTILE else None,
+        breaker=CircuitBreaker(GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET_SECONDS)
+    )
 
 # Initialize Gemini model
 def get_gemini_model():
     # Use the correct model name format
-    return genai.GenerativeModel('gemini-1.5-flash')
+    return get_gemini_manager().get_model(GEMINI_MODEL_NAME)
 
 # File paths
 USERS_DATA_FILE = "users_data.json"
+USERS_DATA_DIR = "users"
 CHATS_DATA_FILE = "chats_data.json"
+CHATS_DATA_DIR = "chats"
+WORKOUTS_JOURNAL_FILE = "users_data.journal"
+
+RESPONSE_CACHE_DIR = "response_cache"
+SEMANTIC_CACHE_FILE = "semantic_cache.jsonl"
+PDF_CACHE_DIR = "pdf_cache"
+TRAINING_LOG_DIR = "training_log"
+SEARCH_INDEX_DIR = "search_index"
+
+# Render Gemini output as it is generated instead of waiting for the full reply
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "1") == "1"
+
+# Instrumentation: a Prometheus endpoint on METRICS_PORT and/or a rotating JSON log,
+# both off unless set. PROFILE_SLOW_RERUNS_MS saves cProfile dumps of slower reruns.
+METRICS_PORT = os.environ.get("METRICS_PORT")
+METRICS_LOG_FILE = os.environ.get("METRICS_LOG_FILE")
+METRICS_LOG_INTERVAL = float(os.environ.get("METRICS_LOG_INTERVAL", "60"))
+PROFILE_SLOW_RERUNS_MS = os.environ.get("PROFILE_SLOW_RERUNS_MS")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+# Bump when the workout prompt changes so old cached responses are not reused
+WORKOUT_PROMPT_VERSION = "1"
+
+# Cosine similarity of the additional notes above which a cached workout with the same
+# type, muscle groups and duration is reused; "off" reuses exact matches only
+SEMANTIC_CACHE_THRESHOLD = os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.85")
+
+# Workout form options
+WORKOUT_TYPES = ["Strength Training", "Cardio", "HIIT", "Yoga", "Calisthenics", "Pilates", "Circuit Training"]
+MUSCLE_GROUPS = ["Full Body", "Upper Body", "Lower Body", "Core", "Back", "Chest", "Arms", "Shoulders", "Legs", "Glutes"]
+# Prefilled additional notes; the semantic cache ignores it, so it cannot outweigh what users add
+NOTES_PLACEHOLDER = "Include any injuries, equipment available, fitness level, or goals."
 
-# User authentication
+# Exercises in the template workout shown when Gemini is unavailable: (name, reps or duration, notes)
+TEMPLATE_EXERCISES = [
+    ("Bodyweight Squat", "Reps: 12", "Keep your chest up and push your knees out over your toes."),
+    ("Push-Ups", "Reps: 10", "Keep a straight line from head to heels; drop to your knees if needed."),
+    ("Reverse Lunges", "Reps: 8 per leg", "Step back far enough that both knees bend to about 90 degrees."),
+    ("Glute Bridge", "Reps: 15", "Squeeze your glutes at the top and avoid arching your lower back."),
+    ("Plank", "Duration: 30 seconds", "Brace your core and keep your hips level."),
+]
+
+# Workout history page sizes
+HISTORY_PAGE_SIZES = [10, 25, 50]
+
+# Coach chat messages rendered at a time, and search hits listed
+COACH_CHAT_WINDOW = int(os.environ.get("COACH_CHAT_WINDOW", "20"))
+COACH_SEARCH_RESULTS = 10
+
+# Storage backend: "json" (default) or "sqlite"
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "json")
+SQLITE_DB_FILE = os.environ.get("SQLITE_DB_FILE", "fitness_data.db")
+
+# How long the JSON backend waits to group-commit concurrent saves; "off" writes each save on its own
+JOURNAL_FLUSH_LATENCY_MS = os.environ.get("JOURNAL_FLUSH_LATENCY_MS", "5")
+JOURNAL_FLUSH_LATENCY = None if JOURNAL_FLUSH_LATENCY_MS == "off" else float(JOURNAL_FLUSH_LATENCY_MS) / 1000
+
+# User authentication (seed accounts for a fresh data store)
 USERS = {
     "Zach": {"password": "ZML", "workouts": []},
     "Mal": {"password": "MMM", "workouts": []}
 }
 
+@st.cache_resource(show_spinner=False)
+def get_data_store():
+    """Open the storage backend once per server process"""
+    return open_storage(
+        STORAGE_BACKEND,
+        USERS,
+        users_file=USERS_DATA_FILE,
+        users_dir=USERS_DATA_DIR,
+        chats_file=CHATS_DATA_FILE,
+        chats_dir=CHATS_DATA_DIR,
+        journal_file=WORKOUTS_JOURNAL_FILE,
+        db_file=SQLITE_DB_FILE,
+        compact_every=int(os.environ.get("JOURNAL_COMPACT_EVERY", "200")),
+        flush_latency=JOURNAL_FLUSH_LATENCY
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    """Create the shared Gemini response cache once per server process"""
+    return ResponseCache(
+        RESPONSE_CACHE_DIR,
+        max_memory_entries=int(os.environ.get("RESPONSE_CACHE_MEMORY_ENTRIES", "256")),
+        max_disk_entries=int(os.environ.get("RESPONSE_CACHE_DISK_ENTRIES", "5000")),
+        ttl_seconds=int(os.environ.get("RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_semantic_cache():
+    """Near-duplicate index over cached workout requests, or None when turned off"""
+    if SEMANTIC_CACHE_THRESHOLD == "off":
+        return None
+    from semantic_cache import SemanticCache
+
+    cache = SemanticCache(
+        SEMANTIC_CACHE_FILE,
+        threshold=float(SEMANTIC_CACHE_THRESHOLD),
+        max_entries=int(os.environ.get("SEMANTIC_CACHE_ENTRIES", "5000")),
+        ignore=(NOTES_PLACEHOLDER,)
+    )
+    # Registered here rather than in get_metrics so numpy stays off the login page
+    get_metrics().add_gauges("semantic_cache", cache.stats)
+    return cache
+
+@st.cache_resource(show_spinner=False)
+def get_single_flight():
+    """Deduplicate identical workout requests across every session"""
+    return SingleFlight()
+
+@st.cache_resource(show_spinner=False)
+def get_pdf_cache():
+    """Create the shared rendered-PDF cache once per server process"""
+    return PdfCache(
+        PDF_CACHE_DIR,
+        max_memory_bytes=int(os.environ.get("PDF_CACHE_MEMORY_MB", "32")) * 1024 * 1024,
+        max_disk_bytes=int(os.environ.get("PDF_CACHE_DISK_MB", "256")) * 1024 * 1024
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_training_log():
+    """Columnar exercise log shared by every session"""
+    from training_log import TrainingLog
+
+    return TrainingLog(TRAINING_LOG_DIR, MUSCLE_GROUPS)
+
+def ensure_training_log(username):
+    """Backfill the exercise log from workouts saved before it existed"""
+    log = get_training_log()
+    if not log.has_user(username):
+        log.rebuild(username, get_data_store().iter_workouts(username))
+    return log
+
+@st.cache_resource(show_spinner=False)
+def get_workout_search_index(username):
+    """Full-text index over one user's workouts, read from disk on first search"""
+    os.makedirs(SEARCH_INDEX_DIR, exist_ok=True)
+    return SearchIndex(os.path.join(SEARCH_INDEX_DIR, f"workouts_{quote(username, safe='')}"))
+
+def workout_search_document(workout):
+    """(doc_id, text, extra_tokens) for indexing one saved workout"""
+    data = workout["data"]
+    text = " ".join([
+        data["workout_type"],
+        " ".join(data.get("muscle_group", [])),
+        data.get("notes", ""),
+        data.get("content", ""),
+    ])
+    return (workout["id"], text, date_tokens(workout["timestamp"]))
+
+def ensure_workout_search_index(username):
+    """Backfill the search index from workouts saved before it existed"""
+    index = get_workout_search_index(username)
+    if not index.exists():
+        index.add_many(
+            workout_search_document(workout)
+            for workout in get_data_store().iter_workouts(username)
+        )
+    return index
+
+@st.cache_resource(show_spinner=False)
+def get_chat_search_index(username):
+    """Full-text index over one user's coach chat, read from disk on first search"""
+    os.makedirs(SEARCH_INDEX_DIR, exist_ok=True)
+    return SearchIndex(os.path.join(SEARCH_INDEX_DIR, f"chats_{quote(username, safe='')}"))
+
+def chat_search_document(record):
+    """(doc_id, text, extra_tokens) for indexing one chat message"""
+    extra_tokens = date_tokens(record["ts"]) if record["ts"] else []
+    return (str(record["index"]), record["text"], extra_tokens)
+
+def ensure_chat_search_index(username):
+    """Backfill the chat index from messages sent before it existed"""
+    index = get_chat_search_index(username)
+    if not index.exists():
+        index.add_many(
+            chat_search_document(record)
+            for record in get_data_store().get_chat_messages(username)
+        )
+    return index
+
+@st.cache_resource(show_spinner=False)
+def get_chat_context_manager():
+    """Share rolling chat summaries across reruns and sessions"""
+    return ChatContextManager(
+        keep_turns=int(os.environ.get("COACH_CONTEXT_TURNS", "6")),
+        token_budget=int(os.environ.get("COACH_CONTEXT_TOKENS", "2000"))
+    )
+
+@st.cache_resource(show_spinner=False)
+def get_metrics():
+    """Process-wide metrics, exported over HTTP and/or to a log file when configured"""
+    metrics = Metrics()
+    # Resolved here: st.cache_resource does not cache calls from the exporter threads
+    metrics.add_gauges("response_cache", get_response_cache().stats)
+    metrics.add_gauges("pdf_cache", get_pdf_cache().stats)
+    metrics.add_gauges("gemini", get_gemini_manager().stats)
+    metrics.add_gauges("single_flight", get_single_flight().stats)
+    metrics.add_gauges("gemini_calls", get_gemini_streamer().stats)
+    if METRICS_PORT:
+        try:
+            MetricsServer(metrics, int(METRICS_PORT)).start()
+        except OSError as e:
+            # Another server process already owns the port
+            print(f"Metrics endpoint not started on port {METRICS_PORT}: {e}", flush=True)
+    if METRICS_LOG_FILE:
+        MetricsLog(metrics, METRICS_LOG_FILE, interval=METRICS_LOG_INTERVAL).start()
+    return metrics
+
+@st.cache_resource(show_spinner=False)
+def get_rerun_profiler():
+    """cProfile capture of slow reruns, or None unless PROFILE_SLOW_RERUNS_MS is set"""
+    if not PROFILE_SLOW_RERUNS_MS:
+        return None
+    return RerunProfiler(float(PROFILE_SLOW_RERUNS_MS) / 1000, PROFILE_DIR)
+
 # File operations
 def save_users_data():
-    """Save user data to a JSON file"""
-    with open(USERS_DATA_FILE, "w") as f:
-        json.dump(USERS, f, indent=4)
+    """Flush all user data to the storage backend"""
+    with get_metrics().timer("save_users"):
+        get_data_store().save_users()
 
 def load_users_data():
-    """Load user data from a JSON file"""
-    global USERS
-    try:
-        with open(USERS_DATA_FILE, "r") as f:
-            USERS = json.load(f)
-    except FileNotFoundError:
-        # If file doesn't exist, save the current data
-        save_users_data()
+    """Pick up user data changed by other processes since the last rerun"""
+    with get_metrics().timer("load_users"):
+        get_data_store().refresh()
 
 def save_chat_history():
-    """Save chat history to a JSON file"""
-    chat_data = {}
-    for username in USERS:
-        if f"chat_history_{username}" in st.session_state:
-            chat_data[username] = st.session_state[f"chat_history_{username}"]
-    
-    with open(CHATS_DATA_FILE, "w") as f:
-        json.dump(chat_data, f, indent=4)
+    """Flush all chat histories to the storage backend"""
+    with get_metrics().timer("save_chats"):
+        get_data_store().save_chats()
 
 def load_chat_history():
-    """Load chat history from a JSON file"""
-    try:
-        with open(CHATS_DATA_FILE, "r") as f:
-            chat_data = json.load(f)
-            
-        # Set the chat history for each user
-        for username, history in chat_data.items():
-            st.session_state[f"chat_history_{username}"] = history
-    except FileNotFoundError:
-        # If file doesn't exist, create empty chat histories
-        for username in USERS:
-            if f"chat_history_{username}" not in st.session_state:
-                st.session_state[f"chat_history_{username}"] = []
-        save_chat_history()
+    """Pick up chat histories changed by other processes since the last rerun"""
+    with get_metrics().timer("load_chats"):
+        get_data_store().refresh()
 
 # Load data on startup
 try:
@@ -96,93 +366,66 @@ def init_session_state():
         st.session_state.current_page = "login"
     if "generate_clicked" not in st.session_state:
         st.session_state.generate_clicked = False
+
+def pdf_download_button(workout_id, workout_data, filename):
+    """Offer a PDF download, rendering the PDF only once the user asks for it"""
+    cache_key = workout_pdf_key(workout_id, workout_data)
+    ready_key = f"pdf_ready_{cache_key}"
     
-    # Initialize chat history for each user if not already done
-    for username in USERS:
-        if f"chat_history_{username}" not in st.session_state:
-            st.session_state[f"chat_history_{username}"] = []
-
-def create_workout_pdf(workout_data):
-    """Create a PDF with the workout details"""
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Set up the PDF
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "Personalized Workout Plan", ln=True, align="C")
-    pdf.line(10, 22, 200, 22)
-    pdf.ln(5)
-    
-    # Add metadata
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, f"Type: {workout_data['workout_type']}", ln=True)
-    pdf.cell(0, 10, f"Muscle Groups: {', '.join(workout_data['muscle_group'])}", ln=True)
-    pdf.cell(0, 10, f"Duration: {workout_data['duration']} minutes", ln=True)
-    pdf.ln(5)
-    
-    # Additional notes
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 10, "Additional Notes:", ln=True)
-    pdf.set_font("Arial", "", 10)
-    pdf.multi_cell(0, 10, workout_data['notes'])
-    pdf.ln(5)
-    
-    # Main workout content
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "Workout Details", ln=True)
-    pdf.ln(2)
-    
-    # We need to process the markdown content for the PDF
-    content_lines = workout_data['content'].split('\n')
-    current_font = ""
-    
-    for line in content_lines:
-        # Handle headers
-        if line.startswith('# '):
-            pdf.set_font("Arial", "B", 14)
-            pdf.cell(0, 10, line[2:], ln=True)
-        elif line.startswith('## '):
-            pdf.set_font("Arial", "B", 12)
-            pdf.cell(0, 10, line[3:], ln=True)
-        elif line.startswith('### '):
-            pdf.set_font("Arial", "B", 11)
-            pdf.cell(0, 10, line[4:], ln=True)
-        # Handle bold text
-        elif line.startswith('**') and line.endswith('**'):
-            pdf.set_font("Arial", "B", 10)
-            pdf.cell(0, 10, line.strip('*'), ln=True)
-        # Handle list items
-        elif line.startswith('- ') or line.startswith('* '):
-            pdf.set_font("Arial", "", 10)
-            pdf.cell(5, 10, "•", ln=0)
-            pdf.cell(0, 10, line[2:], ln=True)
-        # Handle normal text
-        elif line.strip():
-            pdf.set_font("Arial", "", 10)
-            pdf.multi_cell(0, 10, line)
-        # Add spacing for empty lines
-        else:
-            pdf.ln(5)
-    
-    # Footer
-    pdf.ln(10)
-    pdf.set_font("Arial", "I", 8)
-    pdf.cell(0, 10, f"Generated on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True, align="C")
-    pdf.cell(0, 10, "AI Fitness Trainer", ln=True, align="C")
+    if not st.session_state.get(ready_key):
+        if not st.button("Prepare PDF", key=f"prepare_{cache_key}"):
+            return
+        st.session_state[ready_key] = True
     
-    return pdf.output(dest="S").encode("latin1")
+    try:
+        pdf_bytes = get_pdf_cache().get_or_render(
+            cache_key, lambda: render_workout_pdf(workout_data)
+        )
+        st.download_button(
+            label="Download PDF",
+            data=pdf_bytes,
+            file_name=filename,
+            mime="application/pdf",
+            key=f"download_{cache_key}"
+        )
+    except Exception as e:
+        st.error(f"Error creating PDF: {str(e)}")
 
-def get_pdf_download_link(pdf_bytes, filename="workout.pdf"):
-    """Generate a download link for the PDF"""
-    b64 = base64.b64encode(pdf_bytes).decode()
-    href = f'<a href="data:application/pdf;base64,{b64}" download="{filename}">Download PDF</a>'
-    return href
+def render_workout_pdf(workout_data):
+    """create_workout_pdf, timed; only runs on PDF cache misses"""
+    with get_metrics().timer("create_workout_pdf"):
+        return create_workout_pdf(workout_data)
 
-def generate_workout(workout_type, muscle_group, workout_duration, additional_notes):
-    """Generate workout using Gemini AI"""
-    model = get_gemini_model()
-    
-    prompt = f"""
+def workout_cache_key(workout_type, muscle_group, workout_duration, additional_notes):
+    """Cache key for a workout request; muscle group order does not matter"""
+    muscle_groups = ", ".join(sorted(part.strip() for part in muscle_group.split(",")))
+    return make_cache_key(
+        WORKOUT_PROMPT_VERSION, workout_type, muscle_groups, workout_duration, additional_notes
+    )
+
+def workout_scope_key(workout_type, muscle_group, workout_duration):
+    """Semantic cache scope: the workout settings that must match exactly"""
+    return workout_cache_key(workout_type, muscle_group, workout_duration, "")
+
+def cached_workout(cache_key, scope, additional_notes, cache, semantic):
+    """A cached workout for this request or, with the semantic cache on, a near-duplicate one"""
+    cached = cache.get(cache_key)
+    if cached is None and semantic is not None:
+        cached = semantic.lookup(scope, additional_notes, cache.get)
+    return cached
+
+def remember_workout(cache_key, scope, additional_notes, text, cache, semantic):
+    """Cache a generated workout and index its notes for near-duplicate requests"""
+    # A blank workout would be served to every matching request until it expires
+    if not text.strip():
+        return
+    cache.set(cache_key, text)
+    if semantic is not None:
+        semantic.add(scope, additional_notes, cache_key)
+
+def build_workout_prompt(workout_type, muscle_group, workout_duration, additional_notes):
+    """Build the Gemini prompt for a workout request"""
+    return f"""
     Act as a professional fitness trainer. Generate a detailed workout plan with the following specifications:
     - Workout Type: {workout_type}
     - Target Muscle Group: {muscle_group}
@@ -204,25 +447,150 @@ def generate_workout(workout_type, muscle_group, workout_duration, additional_no
     
     Include information on proper form and provide modifications for different fitness levels.
     """
+
+def stream_gemini_response(prompt, op="gemini"):
+    """Yield response text from Gemini, recording latency and sizes under op
+
+    The shared clients are looked up here, in the script thread, so the
+    returned generator can be consumed from any thread.
+    """
+    return timed_gemini_stream(
+        prompt, op, get_metrics(), get_gemini_model(), get_gemini_manager(), get_gemini_streamer()
+    )
+
+def timed_gemini_stream(prompt, op, metrics, model, manager, streamer):
+    metrics.observe("prompt_chars", len(prompt), buckets=SIZE_BUCKETS, op=op)
+    yield from metrics.timed_stream(
+        op, streamer.stream(lambda attempt: gemini_text_chunks(prompt, model, manager, attempt))
+    )
+
+def gemini_text_chunks(prompt, model, manager, attempt=None):
+    """Yield response text from Gemini chunk by chunk as it arrives
+
+    attempt is the streamer's resilience.Attempt; a hedged attempt only
+    runs if a slot is free right away.
+    """
+    queue_timeout = 0 if attempt is not None and attempt.hedge else GEMINI_QUEUE_TIMEOUT
+    # The slot is held until the stream is finished
+    with manager.slot(timeout=queue_timeout):
+        if attempt is not None:
+            # Another attempt may have answered while this one waited
+            if attempt.cancelled.is_set():
+                return
+            attempt.mark_sent()
+        response = model.generate_content(prompt, stream=True)
+        for chunk in response:
+            if attempt is not None and attempt.cancelled.is_set():
+                return
+            # Chunks blocked by the safety filters carry no text
+            try:
+                text = chunk.text
+            except ValueError:
+                continue
+            if text:
+                yield text
+
+def template_workout(workout_type, muscle_group, workout_duration):
+    """A generic workout for when Gemini is unavailable, in the format Gemini is asked for"""
+    main_minutes = max(int(workout_duration) - 8, 2)
+    lines = [
+        f"# {workout_duration}-Minute {workout_type} Workout: {muscle_group}",
+        "",
+        "## Warm-up (5 minutes)",
+        "- Marching or light jog in place: 2 minutes",
+        "- Arm circles, leg swings and hip circles: 3 minutes",
+        "",
+        f"## Main Workout ({main_minutes} minutes)",
+    ]
+    for name, amount, notes in TEMPLATE_EXERCISES:
+        lines += [
+            "",
+            f"- Exercise Name: {name}",
+            "- Sets: 3",
+            f"- {amount}",
+            "- Rest: 60 seconds",
+            f"- Notes: {notes}",
+        ]
+    lines += [
+        "",
+        "## Cool Down (3 minutes)",
+        "- Hamstring and quad stretch: 1 minute",
+        "- Chest and shoulder stretch: 1 minute",
+        "- Child's pose: 1 minute",
+        "",
+        "**Modifications:** Beginners do 2 sets with longer rests; advanced lifters add load or a fourth set.",
+    ]
+    return "\n".join(lines)
+
+def workout_fallback(error, cached, workout_type, muscle_group, workout_duration):
+    """Workout text shown when Gemini fails before answering: the cached one, else a template"""
+    if cached is not None:
+        return f"> The AI trainer is unavailable ({error}), so this is a previously generated workout.\n\n{cached}"
+    return (
+        f"> The AI trainer is unavailable ({error}), so this is a standard template workout. "
+        "Try again later for a personalized plan.\n\n"
+        + template_workout(workout_type, muscle_group, workout_duration)
+    )
+
+def generate_workout_stream(workout_type, muscle_group, workout_duration, additional_notes, use_cache=True):
+    """Stream a workout from Gemini AI, reusing a cached response when possible
+
+    If Gemini fails before sending anything, a cached or template workout
+    is streamed instead; a failure partway through the reply is raised.
+    """
+    cache = get_response_cache()
+    semantic = get_semantic_cache()
+    cache_key = workout_cache_key(workout_type, muscle_group, workout_duration, additional_notes)
+    scope = workout_scope_key(workout_type, muscle_group, workout_duration)
+    if use_cache:
+        cached = cached_workout(cache_key, scope, additional_notes, cache, semantic)
+        if cached is not None:
+            yield cached
+            return
+    
+    prompt = build_workout_prompt(workout_type, muscle_group, workout_duration, additional_notes)
     
+    # Identical requests already in flight share one Gemini call; only
+    # complete, successful responses are cached
+    streamed = False
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        for chunk in get_single_flight().stream(
+            cache_key,
+            stream_gemini_response(prompt, op="generate_workout"),
+            timeout=SINGLE_FLIGHT_TIMEOUT,
+            on_complete=lambda text: remember_workout(
+                cache_key, scope, additional_notes, text, cache, semantic
+            )
+        ):
+            streamed = True
+            yield chunk
     except Exception as e:
-        return f"Error generating workout: {str(e)}"
+        if streamed:
+            raise
+        # With use_cache off the cached workout was skipped, but it beats a template now
+        cached = cached_workout(cache_key, scope, additional_notes, cache, semantic)
+        get_metrics().inc("workout_fallbacks", source="cache" if cached is not None else "template")
+        yield workout_fallback(e, cached, workout_type, muscle_group, workout_duration)
 
-def chat_with_fitness_coach(user_query, chat_history):
-    """Chat with AI fitness coach using Gemini"""
-    model = get_gemini_model()
-    
-    # Format the chat history for context
-    formatted_history = "\n".join([f"{'User' if i % 2 == 0 else 'Coach'}: {msg}" 
-                                    for i, msg in enumerate(chat_history)])
+def generate_workout(workout_type, muscle_group, workout_duration, additional_notes, use_cache=True):
+    """Generate workout using Gemini AI and return the full text"""
+    return "".join(generate_workout_stream(
+        workout_type, muscle_group, workout_duration, additional_notes, use_cache=use_cache
+    ))
+
+def build_coach_prompt(user_query, chat_history, username=None):
+    """Build the Gemini prompt for the next coach reply"""
+    # Recent turns verbatim, older ones folded into a summary within the token budget
+    summary, recent_lines = get_chat_context_manager().build(chat_history, key=username)
+    formatted_history = "\n".join(recent_lines)
     
-    prompt = f"""
+    return f"""
     You are a knowledgeable and supportive fitness coach named Coach Alex. 
     You provide scientifically accurate fitness and nutrition advice while being encouraging and motivating.
     
+    Summary of earlier conversation:
+    {summary or "None"}
+    
     Previous conversation:
     {formatted_history}
     
@@ -232,12 +600,15 @@ def chat_with_fitness_coach(user_query, chat_history):
     but explain concepts in accessible language. If you don't know something, admit it rather than providing
     potentially harmful advice. If asked about specific medical conditions, recommend consulting a healthcare provider.
     """
-    
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        return f"Error communicating with fitness coach: {str(e)}"
+
+def chat_with_fitness_coach_stream(user_query, chat_history, username=None):
+    """Stream the AI fitness coach's reply using Gemini; failures are raised, not returned as text"""
+    prompt = build_coach_prompt(user_query, chat_history, username)
+    return stream_gemini_response(prompt, op="chat_with_fitness_coach")
+
+def chat_with_fitness_coach(user_query, chat_history, username=None):
+    """Chat with AI fitness coach using Gemini"""
+    return "".join(chat_with_fitness_coach_stream(user_query, chat_history, username))
 
 def save_workout(username, workout_data):
     """Save workout to user's history"""
@@ -250,8 +621,18 @@ def save_workout(username, workout_data):
         "data": workout_data
     }
     
-    USERS[username]["workouts"].append(workout_entry)
-    save_users_data()
+    training_log = ensure_training_log(username)
+    search_index = ensure_workout_search_index(username)
+    
+    # Only the new entry is written; the full snapshot is rewritten on compaction
+    with get_metrics().timer("save_workout"):
+        get_data_store().add_workout(username, workout_entry)
+    
+    # Extract sets/reps/rest into the columnar exercise log
+    training_log.add_workout(username, timestamp, workout_data)
+    
+    # Make the workout searchable right away
+    search_index.add(*workout_search_document(workout_entry))
     return workout_id
 
 def login_page():
@@ -263,13 +644,33 @@ def login_page():
         submitted = st.form_submit_button("Login")
         
         if submitted:
-            if username in USERS and USERS[username]["password"] == password:
+            if get_data_store().authenticate(username, password):
                 st.session_state.logged_in = True
                 st.session_state.username = username
                 st.session_state.current_page = "home"
                 st.rerun()
             else:
                 st.error("Invalid username or password")
+    
+    log_startup_timing()
+
+@st.cache_resource(show_spinner=False)
+def get_startup_timing():
+    """Filled in by the first login page render of this server process"""
+    return {}
+
+def log_startup_timing():
+    """Log once per process how long the first rerun took to show the login page"""
+    timing = get_startup_timing()
+    if timing:
+        return
+    timing["login_ready_ms"] = (time.perf_counter() - SCRIPT_STARTED) * 1000
+    timing["heavy_modules"] = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(
+        f"Startup: login page ready {timing['login_ready_ms']:.0f} ms into the first rerun; "
+        f"heavy modules loaded: {', '.join(timing['heavy_modules']) or 'none'}",
+        flush=True
+    )
 
 def navigation():
     col1, col2, col3, col4, col5 = st.columns(5)  # Added one more column for logout
@@ -303,9 +704,9 @@ def navigation():
     
     st.divider()
 
-def logout_button():
+def logout_button(key="logout_button"):
     """Logout button to reset session state"""
-    if st.button("Logout", key="logout_button"):
+    if st.button("Logout", key=key):
         st.session_state.logged_in = False
         st.session_state.username = ""
         st.session_state.current_page = "login"
@@ -326,45 +727,97 @@ def home_page():
     """)
     
     # Display some workout stats
-    if len(USERS[st.session_state.username]["workouts"]) > 0:
-        st.write(f"You have {len(USERS[st.session_state.username]['workouts'])} saved workouts.")
+    store = get_data_store()
+    workout_count = store.count_workouts(st.session_state.username)
+    if workout_count > 0:
+        st.write(f"You have {workout_count} saved workouts.")
         
-        last_workout = USERS[st.session_state.username]["workouts"][-1]
+        last_workout = store.last_workout(st.session_state.username)
         st.write(f"Your last workout was on {last_workout['timestamp']}.")
+        
+        training_stats_section(st.session_state.username)
+
+def training_stats_section(username, weeks=8):
+    """Weekly volume, muscle group balance and trend from the exercise log"""
+    summary = ensure_training_log(username).summary(username, weeks=weeks)
+    if summary["exercises"] == 0:
+        return
+    
+    st.write("### Training Trends")
+    today = datetime.date.today()
+    week_labels = [
+        (today - datetime.timedelta(weeks=weeks - 1 - i)).strftime("%m-%d")
+        for i in range(weeks)
+    ]
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.write("**Weekly volume (sets x reps)**")
+        st.bar_chart(
+            {"Week": week_labels, "Volume": summary["weekly_volume"].tolist()},
+            x="Week", y="Volume"
+        )
+    with col2:
+        muscle_sets = {group: sets for group, sets in summary["muscle_group_sets"].items() if sets}
+        if muscle_sets:
+            st.write("**Sets per muscle group**")
+            st.bar_chart(
+                {"Muscle Group": list(muscle_sets), "Sets": list(muscle_sets.values())},
+                x="Muscle Group", y="Sets"
+            )
+    
+    trend = summary["volume_trend_per_week"]
+    if trend > 0:
+        st.write(f"Your training volume is trending up by about {trend:.0f} reps per week.")
+    elif trend < 0:
+        st.write(f"Your training volume is trending down by about {-trend:.0f} reps per week.")
 
 def generate_workout_page():
     st.title("Generate Custom Workout")
     
     with st.form("workout_form"):
-        workout_type = st.selectbox(
-            "Workout Type",
-            ["Strength Training", "Cardio", "HIIT", "Yoga", "Calisthenics", "Pilates", "Circuit Training"]
-        )
+        workout_type = st.selectbox("Workout Type", WORKOUT_TYPES)
         
-        muscle_group = st.multiselect(
-            "Target Muscle Groups",
-            ["Full Body", "Upper Body", "Lower Body", "Core", "Back", "Chest", "Arms", "Shoulders", "Legs", "Glutes"]
-        )
+        muscle_group = st.multiselect("Target Muscle Groups", MUSCLE_GROUPS)
         
         workout_duration = st.slider("Workout Duration (minutes)", 10, 120, 30, 5)
         
-        additional_notes = st.text_area(
-            "Additional Notes",
-            "Include any injuries, equipment available, fitness level, or goals."
+        additional_notes = st.text_area("Additional Notes", NOTES_PLACEHOLDER)
+        
+        skip_cache = st.checkbox(
+            "Always generate a fresh workout",
+            help="Skip previously generated workouts for the same settings"
         )
         
         generate_button = st.form_submit_button("Generate Workout")
     
     # Handle generate button click
+    just_streamed = False
     if generate_button and not st.session_state.generate_clicked:
         st.session_state.generate_clicked = True
+        muscle_group_str = ", ".join(muscle_group) if muscle_group else "Full Body"
         
-        with st.spinner("Generating your personalized workout..."):
-            muscle_group_str = ", ".join(muscle_group) if muscle_group else "Full Body"
-            workout_content = generate_workout(
-                workout_type, muscle_group_str, workout_duration, additional_notes
-            )
-            
+        workout_content = None
+        try:
+            if STREAM_RESPONSES:
+                # Render text as it arrives; write_stream returns the assembled workout
+                st.subheader("Your Personalized Workout")
+                workout_content = st.write_stream(generate_workout_stream(
+                    workout_type, muscle_group_str, workout_duration, additional_notes,
+                    use_cache=not skip_cache
+                ))
+                just_streamed = True
+            else:
+                with st.spinner("Generating your personalized workout..."):
+                    workout_content = generate_workout(
+                        workout_type, muscle_group_str, workout_duration, additional_notes,
+                        use_cache=not skip_cache
+                    )
+        except Exception as e:
+            # The reply broke off partway; keep the previous workout rather than half a new one
+            st.error(f"Error generating workout: {str(e)}")
+        
+        if workout_content:
             # Save workout data in session state
             st.session_state.current_workout = {
                 "workout_type": workout_type,
@@ -378,8 +831,10 @@ def generate_workout_page():
     if st.session_state.get("current_workout"):
         workout_data = st.session_state.current_workout
         
-        st.subheader("Your Personalized Workout")
-        st.markdown(workout_data["content"])
+        # A freshly streamed workout is already on the page
+        if not just_streamed:
+            st.subheader("Your Personalized Workout")
+            st.markdown(workout_data["content"])
         
         # Action buttons
         col1, col2 = st.columns(2)
@@ -391,17 +846,14 @@ def generate_workout_page():
         
         with col2:
             # Create PDF for download
-            try:
-                pdf_bytes = create_workout_pdf(workout_data)
-                st.markdown(
-                    get_pdf_download_link(pdf_bytes, f"workout_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.pdf"),
-                    unsafe_allow_html=True
-                )
-            except Exception as e:
-                st.error(f"Error creating PDF: {str(e)}")
+            pdf_download_button(
+                "current",
+                workout_data,
+                f"workout_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
+            )
              
             # Text download button
-            workout_text = workout_data["content"]  # Get the workout content
+            workout_text = create_workout_text(workout_data)
             st.download_button(
                 label="Download as Text",
                 data=workout_text,
@@ -409,17 +861,123 @@ def generate_workout_page():
                 mime="text/plain"
             )
             
+def search_workouts(username, query, offset=0, limit=20, max_results=200):
+    """One page of the best full-text matches for query, plus the match count"""
+    results = ensure_workout_search_index(username).search(query, limit=max_results)
+    store = get_data_store()
+    workouts = []
+    for workout_id, _ in results[offset:offset + limit]:
+        workout = store.get_workout(username, workout_id)
+        if workout is not None:
+            workouts.append(workout)
+    return workouts, len(results)
+
+def bulk_export_section(username):
+    """Export every saved workout as one ZIP; returns True while an export is running"""
+    job = st.session_state.get("bulk_export_job")
+    
+    if job is None or not job.running:
+        if st.button("Export All Workouts"):
+            # Remove the previous archive before building a new one
+            if job is not None:
+                job.discard()
+            store = get_data_store()
+            from bulk_export import BulkExportJob
+
+            job = BulkExportJob(
+                store.iter_workouts(username), store.count_workouts(username)
+            ).start()
+            st.session_state.bulk_export_job = job
+    
+    if job is None:
+        return False
+    
+    if job.running:
+        st.progress(job.progress, text=f"Exporting workouts... {job.done}/{job.total}")
+        if st.button("Cancel Export"):
+            job.cancel()
+        return True
+    
+    if job.error:
+        st.error(f"Error exporting workouts: {job.error}")
+    elif job.path:
+        with open(job.path, "rb") as f:
+            st.download_button(
+                label="Download ZIP",
+                data=f,
+                file_name=f"workouts_{username}_{datetime.datetime.now().strftime('%Y%m%d_%H%M')}.zip",
+                mime="application/zip",
+                on_click=finish_bulk_export
+            )
+    elif job.cancelled:
+        # A cancel always discards the archive, even one that arrives after the last workout
+        st.info("Export cancelled.")
+    return False
+
+def finish_bulk_export():
+    """Delete a served export; Streamlit keeps its own copy for the download in progress"""
+    job = st.session_state.pop("bulk_export_job", None)
+    if job is not None:
+        job.discard()
+
 def workout_history_page():
     st.title("Your Workout History")
     
-    user_workouts = USERS[st.session_state.username]["workouts"]
-    
-    if not user_workouts:
+    store = get_data_store()
+    if store.count_workouts(st.session_state.username) == 0:
         st.info("You haven't saved any workouts yet. Generate a workout to get started!")
         return
     
-    # Display workouts in reverse chronological order
-    for i, workout in enumerate(reversed(user_workouts)):
+    export_running = bulk_export_section(st.session_state.username)
+    
+    search_query = st.text_input(
+        "Search workouts", placeholder="e.g. kettlebell march", key="history_search"
+    )
+    
+    # Filters are answered by the backend's time-ordered index
+    filter_col1, filter_col2, filter_col3, filter_col4 = st.columns(4)
+    with filter_col1:
+        type_filter = st.selectbox("Type", ["All"] + WORKOUT_TYPES, key="history_type")
+    with filter_col2:
+        muscle_filter = st.selectbox("Muscle Group", ["All"] + MUSCLE_GROUPS, key="history_muscle")
+    with filter_col3:
+        date_range = st.date_input("Date Range", value=[], key="history_dates")
+    with filter_col4:
+        page_size = st.selectbox("Per Page", HISTORY_PAGE_SIZES, key="history_page_size")
+    
+    start = date_range[0].isoformat() if len(date_range) > 0 else None
+    end = date_range[1].isoformat() if len(date_range) > 1 else start
+    filters = {
+        "workout_type": None if type_filter == "All" else type_filter,
+        "muscle_group": None if muscle_filter == "All" else muscle_filter,
+        "start": start,
+        "end": end,
+    }
+    
+    # Start from the first page whenever the filters change
+    if st.session_state.get("history_filters") != (filters, page_size, search_query):
+        st.session_state.history_filters = (filters, page_size, search_query)
+        st.session_state.history_page = 1
+    
+    page = st.session_state.get("history_page", 1)
+    if search_query.strip():
+        # Ranked search results replace the filtered list
+        user_workouts, total = search_workouts(
+            st.session_state.username, search_query, offset=(page - 1) * page_size, limit=page_size
+        )
+    else:
+        user_workouts, total = store.query_workouts(
+            st.session_state.username, offset=(page - 1) * page_size, limit=page_size, **filters
+        )
+    page_count = max(1, (total + page_size - 1) // page_size)
+    
+    if total == 0:
+        st.info("No workouts match your search or filters.")
+    else:
+        st.caption(f"Showing {len(user_workouts)} of {total} workouts")
+    
+    # Display this page of workouts in reverse chronological order
+    for i, workout in enumerate(user_workouts):
         with st.expander(f"Workout from {workout['timestamp']}"):
             workout_data = workout["data"]
             
@@ -427,6 +985,11 @@ def workout_history_page():
             st.write(f"**Muscle Groups:** {', '.join(workout_data['muscle_group'])}")
             st.write(f"**Duration:** {workout_data['duration']} minutes")
             
+            # Listings carry metadata only; the workout text is read when asked for
+            if not st.toggle("Show workout", key=f"history_show_{workout['id']}"):
+                continue
+            workout_data = store.get_workout(st.session_state.username, workout["id"])["data"]
+            
             st.markdown("### Workout Details")
             st.markdown(workout_data['content'])
             
@@ -435,40 +998,129 @@ def workout_history_page():
             
             with col1:
                 # Create PDF for download
-                try:
-                    pdf_bytes = create_workout_pdf(workout_data)
-                    st.markdown(
-                        get_pdf_download_link(pdf_bytes, f"workout_{workout['id'][:8]}.pdf"),
-                        unsafe_allow_html=True
-                    )
-                except Exception as e:
-                    st.error(f"Error creating PDF: {str(e)}")
+                pdf_download_button(
+                    workout["id"], workout_data, f"workout_{workout['id'][:8]}.pdf"
+                )
                 
             with col2:
                 # Text download button
-                workout_text = workout_data["content"]  # Get the workout content
+                workout_text = create_workout_text(workout_data)
                 st.download_button(
                     label="Download as Text",
                     data=workout_text,
                     file_name=f"workout_{workout['id'][:8]}.txt",
                     mime="text/plain"
                 )
+    
+    # Page navigation
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    with prev_col:
+        if st.button("Previous", disabled=page <= 1):
+            st.session_state.history_page = page - 1
+            st.rerun()
+    with page_col:
+        st.write(f"Page {page} of {page_count}")
+    with next_col:
+        if st.button("Next", disabled=page >= page_count):
+            st.session_state.history_page = page + 1
+            st.rerun()
+    
+    # Poll the background export until it finishes
+    if export_running:
+        time.sleep(1)
+        st.rerun()
+
+def chat_window(count, start):
+    """[start, end) of the chat messages to render; start None follows the latest messages"""
+    if start is None:
+        start = max(0, count - COACH_CHAT_WINDOW)
+    # Windows always begin with a user message
+    start -= start % 2
+    return start, min(count, start + COACH_CHAT_WINDOW)
+
+def jump_to_chat_message(index):
+    """Center the chat window on one message and highlight it"""
+    start = max(0, index - COACH_CHAT_WINDOW // 2)
+    st.session_state.chat_window_start = start
+    st.session_state.chat_highlight = index
+
+def move_chat_window(start):
+    """Show another window of messages; None returns to the latest ones"""
+    st.session_state.chat_window_start = start
+    st.session_state.chat_highlight = None
+
+def chat_search_section(username):
+    """Search box listing the best matching messages with a jump button each"""
+    query = st.text_input("Search conversation", placeholder="e.g. protein", key="chat_search")
+    if not query.strip():
+        return
+    
+    results = ensure_chat_search_index(username).search(query, limit=COACH_SEARCH_RESULTS)
+    store = get_data_store()
+    count = store.count_chat_messages(username)
+    hits = []
+    for doc_id, _ in results:
+        index = int(doc_id)
+        # Only the matching messages are read, never the whole history
+        if index < count:
+            hits.extend(store.get_chat_messages(username, index, index + 1))
+    
+    if not hits:
+        st.info("No messages match your search.")
+        return
+    
+    for record in hits:
+        who = "You" if record["role"] == "user" else "Coach Alex"
+        when = f" ({record['ts']})" if record["ts"] else ""
+        text_col, button_col = st.columns([4, 1])
+        with text_col:
+            st.markdown(f"**Turn {record['turn'] + 1} · {who}{when}:** {first_sentence(record['text'])}")
+        with button_col:
+            st.button(
+                "Jump",
+                key=f"chat_jump_{record['index']}",
+                on_click=jump_to_chat_message,
+                args=(record["index"],)
+            )
 
 def fitness_coach_page():
     st.title("AI Fitness Coach")
     st.write("Ask me anything about fitness, nutrition, or workout techniques!")
     
-    # Get the current user's chat history
-    chat_history_key = f"chat_history_{st.session_state.username}"
+    username = st.session_state.username
+    store = get_data_store()
+    
+    chat_search_section(username)
+    
+    # Render one window of the conversation instead of the whole history
+    count = store.count_chat_messages(username)
+    start, end = chat_window(count, st.session_state.get("chat_window_start"))
+    highlight = st.session_state.get("chat_highlight")
+    
+    if start > 0:
+        st.button(
+            "Show earlier messages",
+            on_click=move_chat_window,
+            args=(max(0, start - COACH_CHAT_WINDOW),)
+        )
     
     # Display chat history with better formatting
     st.container(height=400, border=True)
     with st.container():
-        for i, message in enumerate(st.session_state[chat_history_key]):
-            if i % 2 == 0:  # User message
-                st.markdown(f"<div style='background-color:#f0f2f6; padding:10px; border-radius:5px; margin-bottom:10px;'><strong>You:</strong> {message}</div>", unsafe_allow_html=True)
+        for record in store.get_chat_messages(username, start, end):
+            border = "border:2px solid #ff9800; " if record["index"] == highlight else ""
+            when = f" <span style='color:#888; font-size:0.8em;'>{record['ts']}</span>" if record["ts"] else ""
+            if record["role"] == "user":  # User message
+                st.markdown(f"<div style='background-color:#f0f2f6; {border}padding:10px; border-radius:5px; margin-bottom:10px;'><strong>You:</strong>{when} {record['text']}</div>", unsafe_allow_html=True)
             else:  # Coach response
-                st.markdown(f"<div style='background-color:#e6f7ff; padding:10px; border-radius:5px; margin-bottom:10px;'><strong>Coach Alex:</strong> {message}</div>", unsafe_allow_html=True)
+                st.markdown(f"<div style='background-color:#e6f7ff; {border}padding:10px; border-radius:5px; margin-bottom:10px;'><strong>Coach Alex:</strong>{when} {record['text']}</div>", unsafe_allow_html=True)
+    
+    if end < count:
+        later_col, latest_col = st.columns(2)
+        with later_col:
+            st.button("Show later messages", on_click=move_chat_window, args=(end,))
+        with latest_col:
+            st.button("Back to latest", on_click=move_chat_window, args=(None,))
     
     # Chat input
     with st.form(key="chat_form"):
@@ -476,33 +1128,55 @@ def fitness_coach_page():
         submit_chat = st.form_submit_button("Ask Coach")
     
     if submit_chat and user_query:
-        # Add user query to chat history
-        st.session_state[chat_history_key].append(user_query)
-        
-        with st.spinner("Coach Alex is thinking..."):
-            # Get response from AI
-            coach_response = chat_with_fitness_coach(
-                user_query, 
-                st.session_state[chat_history_key][:-1]  # Exclude current query
-            )
-            
-            # Add coach response to chat history
-            st.session_state[chat_history_key].append(coach_response)
+        # The prompt builder needs the full text history for its rolling summary
+        chat_history = store.get_chat_history(username)
+        try:
+            if STREAM_RESPONSES:
+                # Show the question and stream the reply while it is generated
+                st.markdown(f"**You:** {user_query}")
+                st.markdown("**Coach Alex:**")
+                coach_response = st.write_stream(
+                    chat_with_fitness_coach_stream(user_query, chat_history, username)
+                )
+            else:
+                with st.spinner("Coach Alex is thinking..."):
+                    # Get response from AI
+                    coach_response = chat_with_fitness_coach(user_query, chat_history, username)
+            if not coach_response.strip():
+                raise ValueError("the coach sent an empty reply")
+        except Exception as e:
+            # Nothing is saved, so the question can simply be asked again
+            st.error(f"Error communicating with fitness coach: {str(e)}")
+        else:
+            # Persist only the new question and answer, then index them
+            search_index = ensure_chat_search_index(username)
+            with get_metrics().timer("save_chat_messages"):
+                records = store.append_chat_messages(username, [user_query, coach_response])
+            search_index.add_many(chat_search_document(record) for record in records)
             
-            # Save updated chat history
-            save_chat_history()
-        
-        # Clear input and refresh to show new messages
-        st.rerun()
+            # Follow the latest messages again
+            move_chat_window(None)
+            st.rerun()
     
     # Add option to clear chat history
     if st.button("Clear Chat History"):
-        st.session_state[chat_history_key] = ""
-        save_chat_history()
+        store.clear_chat_history(username)
+        get_chat_search_index(username).clear()
+        move_chat_window(None)
         st.success("Chat history cleared!")
         st.rerun()
 
 def main():
+    """Run one rerun, timed, and profiled when it is slow and profiling is enabled"""
+    metrics = get_metrics()
+    profiler = get_rerun_profiler()
+    with metrics.timer("rerun"):
+        if profiler is None:
+            render_app()
+        else:
+            profiler.run(render_app, label=st.session_state.get("current_page", "login"))
+
+def render_app():
     st.set_page_config(
         page_title="AI Fitness Trainer",
         page_icon="💪",
@@ -517,7 +1191,8 @@ def main():
         login_page()
     else:
         # Show logout in sidebar
-        logout_button()
+        with st.sidebar:
+            logout_button(key="sidebar_logout_button")
         
         # Display user info in sidebar
         st.sidebar.write(f"Logged in as: **{st.session_state.username}**")
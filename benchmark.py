@@ -0,0 +1,345 @@
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from gemini_stub import COACH_TIPS, stub_workout
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Workouts per synthetic user; each run also gets as many chat messages
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+BENCH_USER = "bench"
+BENCH_PASSWORD = "bench"
+
+WORKOUT_TYPES = ("Strength Training", "Cardio", "HIIT", "Yoga", "Calisthenics")
+MUSCLE_GROUPS = ("Full Body", "Upper Body", "Lower Body", "Core", "Back", "Legs")
+
+# Words for the additional notes of synthetic semantic cache entries
+NOTE_WORDS = (
+    "beginner", "intermediate", "advanced", "dumbbells", "kettlebell", "barbell", "bench", "bands",
+    "home", "gym", "quiet", "apartment", "bad knee", "sore shoulder", "low impact", "fat loss",
+    "strength", "endurance", "mobility", "no jumping",
+)
+
+# A metric whose median grows by more than this factor counts as a regression
+DEFAULT_THRESHOLD = 1.25
+
+
+def synthetic_workouts(count, rng):
+    """count saved-workout entries, oldest first, one every few hours up to now"""
+    now = datetime.datetime.now()
+    workouts = []
+    for i in range(count):
+        workout_type = rng.choice(WORKOUT_TYPES)
+        muscle_group = rng.sample(MUSCLE_GROUPS, rng.randint(1, 2))
+        duration = rng.choice((20, 30, 45, 60))
+        timestamp = now - datetime.timedelta(hours=6 * (count - i))
+        workouts.append({
+            "id": f"bench-{i:06d}",
+            "timestamp": timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+            "data": {
+                "workout_type": workout_type,
+                "muscle_group": muscle_group,
+                "duration": duration,
+                "notes": rng.choice(("", "No equipment", "Bad knee, low impact please")),
+                "content": stub_workout(rng, workout_type, ", ".join(muscle_group), duration),
+            },
+        })
+    return workouts
+
+
+def synthetic_chat(count, rng):
+    """count alternating question/answer chat messages"""
+    messages = []
+    for i in range(count):
+        if i % 2 == 0:
+            messages.append(f"Question {i // 2}: how should I adjust my training this week?")
+        else:
+            messages.append(" ".join(rng.sample(COACH_TIPS, 3)))
+    return messages
+
+
+def write_dataset(directory, workouts, chat_messages, seed=0, accounts=None):
+    """Write a users_data.json / chats_data.json pair the app imports on first start
+
+    accounts maps usernames to passwords; by default the one benchmark user.
+    """
+    rng = random.Random(seed)
+    accounts = accounts or {BENCH_USER: BENCH_PASSWORD}
+    users = {
+        username: {"password": password, "workouts": synthetic_workouts(workouts, rng)}
+        for username, password in accounts.items()
+    }
+    with open(os.path.join(directory, "users_data.json"), "w") as f:
+        json.dump(users, f)
+    with open(os.path.join(directory, "chats_data.json"), "w") as f:
+        json.dump({username: synthetic_chat(chat_messages, rng) for username in accounts}, f)
+
+
+def measure(func, repeat):
+    """Run func repeat times; median and minimum wall time in milliseconds
+
+    A failing call is recorded as the metric's error instead of ending the run.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+        times.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "runs": repeat}
+
+
+def measure_once(func):
+    return measure(func, 1)
+
+
+def keep_resources(module):
+    """Make the st.cache_resource getters of module keep their results outside a script run
+
+    Streamlit only stores cache_resource results during a script run, so
+    called bare, as here, every get_data_store() would open a new store.
+    A server process shares one, and so does the benchmark.
+    """
+    for name, value in list(vars(module).items()):
+        if callable(value) and hasattr(value, "clear") and hasattr(value, "__wrapped__"):
+            setattr(module, name, memoized(value.__wrapped__))
+
+
+def memoized(func):
+    results = {}
+
+    def wrapper(*args):
+        if args not in results:
+            results[args] = func(*args)
+        return results[args]
+
+    wrapper.clear = results.clear
+    return wrapper
+
+
+def run_size(workouts, chat_messages, repeat):
+    """Time the app's hot paths against a fresh synthetic data set in the current directory
+
+    Called in a child process so every size starts with cold caches.
+    """
+    write_dataset(os.getcwd(), workouts, chat_messages)
+    os.environ["GEMINI_STUB"] = "1"
+    # Without a key the app shows an error before set_page_config, which AppTest rejects
+    os.environ.setdefault("GEMINI_API_KEY", "stub")
+    sys.path.insert(0, APP_DIR)
+
+    from streamlit.testing.v1 import AppTest
+
+    results = {}
+    start = time.perf_counter()
+    # Importing the app opens the store, which splits the JSON files into shards
+    import app
+    elapsed = (time.perf_counter() - start) * 1000
+    results["import_and_migrate"] = {"median_ms": elapsed, "min_ms": elapsed, "runs": 1}
+    keep_resources(app)
+
+    store = app.get_data_store()
+
+    def cold_load():
+        app.get_data_store.clear()
+        app.load_users_data()
+        app.get_data_store().count_workouts(BENCH_USER)
+
+    results["load_users_data_cold"] = measure(cold_load, repeat)
+    store = app.get_data_store()
+    store.count_workouts(BENCH_USER)
+    results["load_users_data"] = measure(app.load_users_data, repeat)
+    results["query_workouts_page"] = measure(lambda: store.query_workouts(BENCH_USER, limit=10), repeat)
+
+    sample = store.get_workout(BENCH_USER, store.last_workout(BENCH_USER)["id"])["data"]
+
+    # The first save also backfills the training log and the search index
+    results["save_workout_first"] = measure_once(lambda: app.save_workout(BENCH_USER, sample))
+    results["save_workout"] = measure(lambda: app.save_workout(BENCH_USER, sample), repeat)
+
+    chat_history = store.get_chat_history(BENCH_USER)
+    results["save_chat_history"] = measure(app.save_chat_history, repeat)
+
+    results["create_workout_pdf"] = measure(lambda: app.create_workout_pdf(sample), repeat)
+
+    results["build_workout_prompt"] = measure(
+        lambda: app.build_workout_prompt("HIIT", "Core, Legs", 30, "No equipment"), repeat
+    )
+    query = "How do I break through a squat plateau?"
+    # The first call folds the whole history into the rolling summary
+    results["build_coach_prompt_first"] = measure_once(
+        lambda: app.build_coach_prompt(query, chat_history, BENCH_USER)
+    )
+    results["build_coach_prompt"] = measure(
+        lambda: app.build_coach_prompt(query, chat_history, BENCH_USER), repeat
+    )
+    results["generate_workout_stub"] = measure(
+        lambda: app.generate_workout("HIIT", "Core, Legs", 30, "No equipment", use_cache=False), repeat
+    )
+
+    # Near-duplicate search over as many cached requests as saved workouts, all in one scope
+    from semantic_cache import SemanticCache
+
+    semantic = SemanticCache(os.path.join(os.getcwd(), "bench_semantic_cache.jsonl"), max_entries=workouts + 1)
+    scope = app.workout_scope_key("HIIT", "Core, Legs", 30)
+    rng = random.Random(0)
+    for i in range(workouts):
+        semantic.add(scope, ", ".join(rng.sample(NOTE_WORDS, 3)), f"bench-{i}")
+    results["semantic_cache_search"] = measure(
+        lambda: semantic.search(scope, "beginner at home with dumbbells", k=3), repeat
+    )
+
+    # The history page as a logged-in user, through the real script runner
+    def render_history():
+        at = AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=600)
+        at.session_state["logged_in"] = True
+        at.session_state["username"] = BENCH_USER
+        at.session_state["current_page"] = "workout_history"
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"History page failed: {at.exception[0].value}")
+
+    results["history_page_render"] = measure(render_history, repeat)
+    return results
+
+
+def run_child(workouts, chat_messages, repeat):
+    """Run one size in a fresh interpreter and working directory"""
+    with tempfile.TemporaryDirectory(prefix="fitness_bench_") as directory:
+        out_path = os.path.join(directory, "result.json")
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", str(workouts),
+             str(chat_messages), str(repeat), out_path],
+            cwd=directory,
+            check=True
+        )
+        with open(out_path) as f:
+            return json.load(f)
+
+
+def scaling_exponents(sizes, results):
+    """Log-log slope of each metric's median between the smallest and largest size
+
+    About 0 means constant time, 1 linear, 2 quadratic.
+    """
+    if len(sizes) < 2:
+        return {}
+    small, large = str(min(sizes)), str(max(sizes))
+    exponents = {}
+    for metric, timing in results[large].items():
+        before = results[small].get(metric)
+        if not before or not before.get("median_ms") or not timing.get("median_ms"):
+            continue
+        exponents[metric] = math.log(timing["median_ms"] / before["median_ms"]) / math.log(max(sizes) / min(sizes))
+    return exponents
+
+
+def print_report(report):
+    sizes = [str(size) for size in report["sizes"]]
+    metrics = list(report["results"][sizes[0]])
+    print(f"{'metric (median ms)':28}" + "".join(f"{size:>12}" for size in sizes) + "   scaling")
+    for metric in metrics:
+        timings = [report["results"][size].get(metric, {}) for size in sizes]
+        row = "".join(
+            f"{timing['median_ms']:12.2f}" if "median_ms" in timing else f"{'error':>12}"
+            for timing in timings
+        )
+        exponent = report["scaling"].get(metric)
+        scaling = f"   n^{exponent:.2f}" if exponent is not None else ""
+        print(f"{metric:28}{row}{scaling}")
+    for size in sizes:
+        for metric, timing in report["results"][size].items():
+            if "error" in timing:
+                print(f"{metric} @ {size} failed: {timing['error']}")
+
+
+def compare(report, baseline_path, threshold):
+    """Print metrics that got slower than in baseline_path; True if none did"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = []
+    for size, metrics in report["results"].items():
+        for metric, timing in metrics.items():
+            before = baseline["results"].get(size, {}).get(metric)
+            if not before or not before.get("median_ms") or "median_ms" not in timing:
+                continue
+            ratio = timing["median_ms"] / before["median_ms"]
+            if ratio > threshold:
+                regressions.append((size, metric, before["median_ms"], timing["median_ms"], ratio))
+
+    print()
+    if not regressions:
+        print(f"No regressions over {threshold:.2f}x against {baseline_path}")
+        return True
+    print(f"Regressions over {threshold:.2f}x against {baseline_path}:")
+    for size, metric, before, after, ratio in regressions:
+        print(f"  {metric} @ {size}: {before:.2f} ms -> {after:.2f} ms ({ratio:.2f}x)")
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app against synthetic users")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated workouts per user")
+    parser.add_argument("--chat-messages", type=int, default=None,
+                        help="chat messages per user (default: same as the workout count)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per timing")
+    parser.add_argument("--output", default=None, help="JSON results file")
+    parser.add_argument("--compare", default=None, help="earlier JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        workouts, chat_messages, repeat, out_path = args.child
+        results = run_size(int(workouts), int(chat_messages), int(repeat))
+        with open(out_path, "w") as f:
+            json.dump(results, f)
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = {}
+    for size in sizes:
+        chat_messages = args.chat_messages if args.chat_messages is not None else size
+        print(f"Benchmarking {size} workouts, {chat_messages} chat messages...", file=sys.stderr, flush=True)
+        results[str(size)] = run_child(size, chat_messages, args.repeat)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "sizes": sizes,
+        "results": results,
+        "scaling": scaling_exponents(sizes, results),
+    }
+    print_report(report)
+
+    output = args.output or os.path.join(
+        "bench_results", f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.compare and not compare(report, args.compare, args.threshold):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
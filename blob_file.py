@@ -0,0 +1,59 @@
+import mmap
+import os
+import threading
+
+
+class BlobFile:
+    """Append-only file of text blobs, read back through a memory map
+
+    Blobs are located by the (offset, length) pair append returns, so
+    callers keep only that small reference in memory. Appends use O_APPEND,
+    which makes them safe across processes without a lock; the map is
+    widened whenever a read reaches past its end.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._map = None
+        self._lock = threading.Lock()
+
+    def append(self, text):
+        """Durably append one blob; returns its [offset, length]"""
+        return self.append_many([text])[0]
+
+    def append_many(self, texts):
+        """Durably append blobs with one write and one fsync; returns their [offset, length]s"""
+        blobs = [text.encode("utf-8") for text in texts]
+        data = b"".join(blobs)
+        with open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            # With O_APPEND the file position is the end of our own write
+            offset = f.tell() - len(data)
+        refs = []
+        for blob in blobs:
+            refs.append([offset, len(blob)])
+            offset += len(blob)
+        return refs
+
+    def read(self, offset, length):
+        """The blob stored at offset"""
+        if length == 0:
+            return ""
+        with self._lock:
+            if self._map is None or offset + length > len(self._map):
+                self._remap()
+            return self._map[offset:offset + length].decode("utf-8")
+
+    def _remap(self):
+        if self._map is not None:
+            self._map.close()
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
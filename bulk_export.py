@@ -0,0 +1,116 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from workout_export import create_workout_pdf, create_workout_text
+
+
+def render_workout_files(workout):
+    """Render the JSON, text and PDF exports of one workout entry
+
+    Runs in a worker process, so it only uses importable, picklable code.
+    Returns a list of (archive name, bytes) pairs.
+    """
+    workout_data = workout["data"]
+    prefix = f"workout_{workout['timestamp'][:10]}_{workout['id'][:8]}"
+
+    files = [
+        (f"{prefix}.json", json.dumps(workout, indent=2).encode("utf-8")),
+        (f"{prefix}.txt", create_workout_text(workout_data).encode("utf-8")),
+    ]
+    try:
+        files.append((f"{prefix}.pdf", create_workout_pdf(workout_data)))
+    except Exception as e:
+        files.append((f"{prefix}_pdf_error.txt", f"Error creating PDF: {str(e)}".encode("utf-8")))
+    return files
+
+
+class BulkExportJob:
+    """Builds a ZIP of every workout in a background thread using a process pool
+
+    At most a few renders per worker are in flight at a time, and each result
+    is written to the archive as soon as it arrives. The archive lives in a
+    temporary file, so memory use does not grow with the number of workouts.
+    """
+
+    def __init__(self, workouts, total, max_workers=None):
+        self.workouts = workouts
+        self.total = total
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.done = 0
+        self.path = None
+        self.error = None
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        """Stop submitting work and delete the partial archive"""
+        self._cancelled.set()
+
+    def discard(self):
+        """Delete the finished archive, e.g. once it has been served"""
+        path, self.path = self.path, None
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    def _run(self):
+        fd, path = tempfile.mkstemp(prefix="workouts_", suffix=".zip")
+        try:
+            with os.fdopen(fd, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as archive:
+                self._write_archive(archive)
+        except Exception as e:
+            self.error = str(e)
+
+        if self.cancelled or self.error:
+            os.remove(path)
+        else:
+            self.path = path
+
+    def _write_archive(self, archive):
+        # Spawned workers only import this module and the exporters, not the Streamlit app
+        context = multiprocessing.get_context("spawn")
+        max_pending = self.max_workers * 4
+        workouts = iter(self.workouts)
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context) as pool:
+            pending = set()
+            exhausted = False
+            while not self.cancelled:
+                while not exhausted and len(pending) < max_pending:
+                    workout = next(workouts, None)
+                    if workout is None:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(render_workout_files, workout))
+
+                if not pending:
+                    break
+
+                finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    for name, data in future.result():
+                        archive.writestr(name, data)
+                    self.done += 1
+
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,111 @@
+import re
+import threading
+
+# Rough characters-per-token ratio for English text with Gemini's tokenizer
+CHARS_PER_TOKEN = 4
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    """Cheap local token estimate; never calls the API"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def first_sentence(text, max_chars=160):
+    """First sentence of a message, shortened to max_chars"""
+    text = " ".join(str(text).split())
+    sentence = SENTENCE_END.split(text, maxsplit=1)[0]
+    if len(sentence) > max_chars:
+        sentence = sentence[:max_chars - 3].rstrip() + "..."
+    return sentence
+
+
+def speaker(index):
+    """Chat histories alternate user and coach messages"""
+    return "User" if index % 2 == 0 else "Coach"
+
+
+class RollingSummary:
+    """Compressed notes for the messages folded out of the verbatim window"""
+
+    def __init__(self):
+        self.folded_upto = 0
+        self.first_message = None
+        self.lines = []
+        self.tokens = 0
+
+    def fold(self, chat_history, upto, max_tokens):
+        """Fold messages [folded_upto, upto) into the summary, oldest lines dropped first"""
+        for index in range(self.folded_upto, upto):
+            line = f"- {speaker(index)}: {first_sentence(chat_history[index])}"
+            self.lines.append(line)
+            self.tokens += estimate_tokens(line) + 1
+        self.folded_upto = max(self.folded_upto, upto)
+
+        while self.lines and self.tokens > max_tokens:
+            self.tokens -= estimate_tokens(self.lines.pop(0)) + 1
+
+    def text(self):
+        return "\n".join(self.lines)
+
+
+class ChatContextManager:
+    """Builds a bounded prompt context for the coach chat
+
+    The last keep_turns turns are kept verbatim. Older turns are folded one
+    sentence each into a rolling summary that is cached per user and only
+    extended with the newly folded messages on each turn. The summary may use
+    at most a quarter of token_budget; if the verbatim turns still do not fit,
+    the oldest of them are folded too.
+    """
+
+    def __init__(self, keep_turns=6, token_budget=2000):
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def _summary_for(self, key, chat_history):
+        """Cached summary for key, reset if the history it was built from is gone"""
+        summary = self._summaries.get(key) if key is not None else None
+        if (
+            summary is None
+            or summary.folded_upto > len(chat_history)
+            or (chat_history and summary.first_message != chat_history[0])
+        ):
+            summary = RollingSummary()
+            summary.first_message = chat_history[0] if chat_history else None
+            if key is not None:
+                self._summaries[key] = summary
+        return summary
+
+    def build(self, chat_history, key=None):
+        """Return (summary_text, recent_lines) for the prompt
+
+        key identifies whose summary to reuse (usually the username); without
+        one the summary is rebuilt from scratch.
+        """
+        summary_budget = self.token_budget // 4
+        with self._lock:
+            summary = self._summary_for(key, chat_history)
+
+            # Fold whole turns so the verbatim window always starts with a user message
+            start = max(0, len(chat_history) - self.keep_turns * 2)
+            start = max(start - start % 2, summary.folded_upto)
+
+            recent = [
+                f"{speaker(index)}: {chat_history[index]}"
+                for index in range(start, len(chat_history))
+            ]
+            recent_tokens = sum(estimate_tokens(line) + 1 for line in recent)
+
+            while recent and recent_tokens + min(summary.tokens, summary_budget) > self.token_budget:
+                drop = min(2, len(recent))
+                for line in recent[:drop]:
+                    recent_tokens -= estimate_tokens(line) + 1
+                recent = recent[drop:]
+                start += drop
+
+            summary.fold(chat_history, start, summary_budget)
+            return summary.text(), recent
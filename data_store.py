@@ -0,0 +1,495 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from urllib.parse import quote, unquote
+
+from blob_file import BlobFile
+from journal import Journal, JournalFlusher
+from storage import StorageBackend, chat_record, new_chat_records
+from workout_index import WorkoutIndex
+
+
+class DataStore(StorageBackend):
+    """JSON-file storage backend with one shard per user
+
+    Each user's password and workouts are a journal/snapshot pair under
+    users_dir, listed in a small manifest next to them. A shard is read the
+    first time its user is looked up and re-checked once per refresh(), so
+    logins, page renders and saves only touch the current user's files.
+    Chat histories are split the same way under chats_dir.
+
+    Workout content lives in an append-only ``.blobs`` file per shard. The
+    journal and snapshot keep only metadata and a ``"blob": [offset,
+    length]`` reference, so last_workout and query_workouts return entries
+    without ``data["content"]``; get_workout and iter_workouts read it back
+    through a memory map.
+
+    Published dicts are never mutated in place. Writers copy the parts they
+    touch and swap in new top-level dicts, so a session that grabbed
+    ``store.users`` at the start of a rerun keeps a consistent view even while
+    another session saves.
+
+    With flush_latency set, journal appends go through a JournalFlusher so
+    concurrent saves are group-committed. Data is published in memory
+    before the append and the writer waits for durability outside the store
+    lock. Compactions rebuild the snapshot from the files under the journal
+    lock, so records written by other processes are never dropped.
+    """
+
+    def __init__(self, users_file, chats_file, journal_file, default_users,
+                 compact_every=200, chats_dir="chats", flush_latency=None, users_dir="users"):
+        self.users_file = users_file
+        self.journal_file = journal_file
+        self.users_dir = users_dir
+        self.chats_file = chats_file
+        self.chats_dir = chats_dir
+        self.compact_every = compact_every
+        self.flusher = JournalFlusher(flush_latency) if flush_latency is not None else None
+        self.manifest_journal = Journal(
+            os.path.join(users_dir, "manifest.journal"), os.path.join(users_dir, "manifest.json")
+        )
+        self.default_users = default_users
+        self.version = 0
+        self.manifest = {}
+        self.users = {}
+        self.chats = {}
+        self._lock = threading.RLock()
+        self._manifest_stamp = None
+        self._user_journals = {}
+        self._user_stamps = {}
+        self._blob_files = {}
+        self._verified = set()
+        self._indexes = {}
+        self._chat_journals = {}
+        self._chat_stamps = {}
+        self._import_legacy_users()
+        self._import_legacy_chats()
+        self.refresh()
+
+    def _publish(self, users=None, chats=None):
+        """Swap in new data and bump the version"""
+        if users is not None:
+            self.users = users
+        if chats is not None:
+            self.chats = chats
+        self.version += 1
+
+    def _import_legacy_users(self):
+        """Split an old users_data.json and its journal into per-user shards
+
+        Without one, the shards are seeded from default_users. The shards are
+        built in a temporary directory that is renamed into place, so a crash
+        or a second process never sees a half-imported users_dir.
+        """
+        if os.path.isdir(self.users_dir):
+            return
+        users, records = self.default_users, []
+        if os.path.exists(self.users_file) or os.path.exists(self.journal_file):
+            legacy = Journal(self.journal_file, self.users_file)
+            with legacy.locked():
+                users = legacy.load_snapshot(self.default_users)
+                records = legacy.replay()
+        # Copy the workout lists so replaying never touches default_users
+        users = {name: dict(user, workouts=list(user["workouts"])) for name, user in users.items()}
+        known_ids = {
+            workout["id"]
+            for user in users.values()
+            for workout in user["workouts"]
+        }
+        for record in records:
+            if record.get("op") == "add_workout":
+                user = users.setdefault(record["user"], {"password": "", "workouts": []})
+                apply_workout_record(user, record, known_ids)
+
+        parent = os.path.dirname(os.path.abspath(self.users_dir))
+        tmp_dir = tempfile.mkdtemp(prefix=".users_", dir=parent)
+        manifest = {}
+        for username, user in users.items():
+            shard = shard_name(username)
+            manifest[username] = shard
+            blobs = BlobFile(os.path.join(tmp_dir, f"{shard}.blobs"))
+            workouts = split_content(user["workouts"], blobs)
+            Journal(
+                os.path.join(tmp_dir, f"{shard}.journal"), os.path.join(tmp_dir, f"{shard}.json")
+            ).write_snapshot({"password": user["password"], "workouts": workouts}, indent=None)
+        Journal(
+            os.path.join(tmp_dir, "manifest.journal"), os.path.join(tmp_dir, "manifest.json")
+        ).write_snapshot({"users": manifest})
+        try:
+            os.rename(tmp_dir, self.users_dir)
+        except OSError:
+            # Another process finished its import first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _read_manifest(self):
+        """Username to shard name, as on disk; call with the manifest locked"""
+        return dict(self.manifest_journal.load_snapshot({"users": {}})["users"])
+
+    def refresh(self):
+        """Re-read the manifest if it changed; every shard is re-checked on its next lookup"""
+        stamp = file_stamp(self.manifest_journal.snapshot_path, self.manifest_journal.path)
+        if stamp != self._manifest_stamp:
+            with self._lock, self.manifest_journal.locked():
+                self.manifest = self._read_manifest()
+                self._manifest_stamp = file_stamp(
+                    self.manifest_journal.snapshot_path, self.manifest_journal.path
+                )
+        self._verified = set()
+        return self
+
+    def usernames(self):
+        """Users listed in the manifest"""
+        return sorted(self.manifest)
+
+    def _user_journal(self, username):
+        """Journal and snapshot files of one user's shard, or None for unknown users"""
+        journal = self._user_journals.get(username)
+        if journal is None:
+            shard = self.manifest.get(username)
+            if shard is None:
+                return None
+            base = os.path.join(self.users_dir, shard)
+            journal = Journal(
+                f"{base}.journal", f"{base}.json", self.compact_every, self.flusher
+            )
+            self._user_journals[username] = journal
+        return journal
+
+    def _blobs(self, username):
+        """Content blob file of one user's shard"""
+        blobs = self._blob_files.get(username)
+        if blobs is None:
+            blobs = BlobFile(os.path.join(self.users_dir, f"{self.manifest[username]}.blobs"))
+            self._blob_files[username] = blobs
+        return blobs
+
+    def _with_content(self, username, entry):
+        """Full workout entry for a metadata entry, content read from the blob file"""
+        data = dict(entry["data"], content=self._blobs(username).read(*entry["blob"]))
+        return {"id": entry["id"], "timestamp": entry["timestamp"], "data": data}
+
+    @staticmethod
+    def _without_blob(entry):
+        """Metadata entry in the StorageBackend shape, without the internal blob reference"""
+        return {"id": entry["id"], "timestamp": entry["timestamp"], "data": entry["data"]}
+
+    def _read_user(self, journal):
+        """One user's shard as on disk; call with the journal locked"""
+        user = journal.load_snapshot({"password": "", "workouts": []})
+        records = journal.replay()
+        if records:
+            known_ids = {workout["id"] for workout in user["workouts"]}
+            for record in records:
+                apply_workout_record(user, record, known_ids)
+        return user
+
+    def get_user(self, username):
+        """``{"password", "workouts"}`` for one user, or None if the user is unknown
+
+        The shard is only read from disk the first time, or when its files
+        changed since this process last read or wrote them.
+        """
+        user = self.users.get(username)
+        if user is not None and username in self._verified:
+            return user
+        journal = self._user_journal(username)
+        if journal is None:
+            return None
+        if user is not None and self._user_stamps.get(username) == file_stamp(
+            journal.snapshot_path, journal.path
+        ):
+            self._verified.add(username)
+            return user
+
+        with self._lock:
+            # Queued appends hold data that is already published; land them first
+            journal.flush()
+            with journal.locked():
+                user = self._read_user(journal)
+                self._set_user(username, user, journal)
+            self._verified.add(username)
+            return user
+
+    def _set_user(self, username, user, journal):
+        """Publish one user's data and remember the file state behind it"""
+        users = dict(self.users)
+        users[username] = user
+        self._publish(users=users)
+        self._user_stamps[username] = file_stamp(journal.snapshot_path, journal.path)
+
+    def authenticate(self, username, password):
+        user = self.get_user(username)
+        return user is not None and user["password"] == password
+
+    def count_workouts(self, username):
+        return len(self.get_user(username)["workouts"])
+
+    def last_workout(self, username):
+        workouts = self.get_user(username)["workouts"]
+        return self._without_blob(workouts[-1]) if workouts else None
+
+    def _workout_index(self, username):
+        """Time-ordered index for one user's current workout list, built on first use"""
+        workouts = self.get_user(username)["workouts"]
+        cached = self._indexes.get(username)
+        if cached is None or cached[0] is not workouts:
+            cached = (workouts, WorkoutIndex(workouts))
+            self._indexes[username] = cached
+        return cached
+
+    def get_workout(self, username, workout_id):
+        with self._lock:
+            workouts, index = self._workout_index(username)
+            position = index.positions_by_id.get(workout_id)
+        if position is None:
+            return None
+        return self._with_content(username, workouts[position])
+
+    def iter_workouts(self, username):
+        """Full workout entries, newest first, with content read one at a time"""
+        for entry in reversed(self.get_user(username)["workouts"]):
+            yield self._with_content(username, entry)
+
+    def query_workouts(self, username, workout_type=None, muscle_group=None,
+                       start=None, end=None, offset=0, limit=20):
+        with self._lock:
+            workouts, index = self._workout_index(username)
+            positions, total = index.query(workout_type, muscle_group, start, end, offset, limit)
+            return [self._without_blob(workouts[position]) for position in positions], total
+
+    def add_workout(self, username, entry):
+        """Publish a workout entry for one user and wait until its journal record is durable"""
+        # The content is on disk before any record points at it
+        entry = split_content([entry], self._blobs(username))[0]
+        with self._lock:
+            user = dict(self.get_user(username))
+            user["workouts"] = user["workouts"] + [entry]
+            journal = self._user_journal(username)
+
+            # Keep an already built index in step instead of rebuilding it
+            cached = self._indexes.pop(username, None)
+            if cached is not None and cached[1].add(len(user["workouts"]) - 1, entry):
+                self._indexes[username] = (user["workouts"], cached[1])
+
+            self._set_user(username, user, journal)
+            # Queue the record before unlocking so a reload always waits for it
+            pending = journal.submit([{"op": "add_workout", "entry": entry}])
+
+        compaction_due = pending.wait()
+        with self._lock:
+            # Our own append should not look like another process's change
+            self._user_stamps[username] = file_stamp(journal.snapshot_path, journal.path)
+        if compaction_due:
+            self._compact_user(username)
+
+    def _compact_user(self, username):
+        """Fold one user's journal into their shard snapshot, rebuilt from the files"""
+        journal = self._user_journal(username)
+        journal.flush()
+        with journal.locked():
+            journal.write_snapshot(self._read_user(journal), indent=None)
+
+    def save_users(self):
+        """Compact the shard of every user loaded by this process
+
+        Snapshots are rebuilt from the files rather than from memory, so they
+        include workouts other processes journaled in the meantime.
+        """
+        for username in list(self.users):
+            self._compact_user(username)
+
+    def _import_legacy_chats(self):
+        """Split an old single-file chats_data.json into per-user chat segments
+
+        Like the user shards, they are built in a temporary directory that is
+        renamed into place, so a crash or a second process never leaves a
+        chats_dir missing some users.
+        """
+        if os.path.isdir(self.chats_dir):
+            return
+        try:
+            with open(self.chats_file, "r") as f:
+                chat_data = json.load(f)
+        except FileNotFoundError:
+            chat_data = {}
+
+        parent = os.path.dirname(os.path.abspath(self.chats_dir))
+        tmp_dir = tempfile.mkdtemp(prefix=".chats_", dir=parent)
+        for username, history in chat_data.items():
+            base = os.path.join(tmp_dir, quote(username, safe=""))
+            # Older versions could store "" after clearing a chat
+            messages = list(history) if history else []
+            Journal(f"{base}.journal", f"{base}.json").write_snapshot(
+                {"messages": messages}, indent=None
+            )
+        try:
+            os.rename(tmp_dir, self.chats_dir)
+        except OSError:
+            # Another process finished its import first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _chat_journal(self, username):
+        """Journal and snapshot files holding one user's chat history"""
+        journal = self._chat_journals.get(username)
+        if journal is None:
+            base = os.path.join(self.chats_dir, quote(username, safe=""))
+            journal = Journal(
+                f"{base}.journal", f"{base}.json", self.compact_every, self.flusher
+            )
+            self._chat_journals[username] = journal
+        return journal
+
+    def chat_usernames(self):
+        """Users that have a chat history on disk"""
+        names = set()
+        for filename in os.listdir(self.chats_dir):
+            base, ext = os.path.splitext(filename)
+            if ext in (".json", ".journal"):
+                names.add(unquote(base))
+        return sorted(names)
+
+    def _read_chat(self, journal):
+        """One user's chat as on disk; call with the journal locked
+
+        Returns (snapshot, records) where snapshot is what compacting the
+        journal right now would write.
+        """
+        snapshot = journal.load_snapshot({"messages": []})
+        folded = set(snapshot.get("folded", []))
+        history = list(snapshot["messages"])
+        record_ids = []
+        for record in journal.replay():
+            record_ids.append(record["id"])
+            # A crash during compaction leaves records the snapshot already holds
+            if record["id"] not in folded:
+                history.extend(record["messages"])
+
+        # Imported chats_data.json histories are plain strings, and two processes
+        # appending at once can hand out the same indexes; number messages by position
+        records = []
+        for index, message in enumerate(history):
+            if isinstance(message, str):
+                message = chat_record(index, message)
+            elif message["index"] != index:
+                message = chat_record(index, message["text"], message["ts"])
+            records.append(message)
+        return {"folded": record_ids, "messages": records}, records
+
+    def _chat_records(self, username):
+        """One user's chat records, reloaded when their files change on disk"""
+        journal = self._chat_journal(username)
+        stamp = file_stamp(journal.snapshot_path, journal.path)
+        if username in self.chats and self._chat_stamps.get(username) == stamp:
+            return self.chats[username]
+
+        with self._lock:
+            journal.flush()
+            with journal.locked():
+                _, history = self._read_chat(journal)
+                self._set_chat_history(username, history, journal)
+            return history
+
+    def get_chat_history(self, username):
+        return [record["text"] for record in self._chat_records(username)]
+
+    def count_chat_messages(self, username):
+        return len(self._chat_records(username))
+
+    def get_chat_messages(self, username, start=0, end=None):
+        return self._chat_records(username)[start:end]
+
+    def append_chat_messages(self, username, messages):
+        """Journal only the new messages for one user"""
+        with self._lock:
+            history = self._chat_records(username)
+            records = new_chat_records(len(history), messages)
+            journal = self._chat_journal(username)
+            self._set_chat_history(username, history + records, journal)
+            # Unique record ids let processes append without agreeing on a sequence
+            pending = journal.submit(
+                [{"id": uuid.uuid4().hex, "op": "append", "messages": records}]
+            )
+
+        compaction_due = pending.wait()
+        with self._lock:
+            self._chat_stamps[username] = file_stamp(journal.snapshot_path, journal.path)
+        if compaction_due:
+            self._compact_chat(journal)
+        return records
+
+    def clear_chat_history(self, username):
+        with self._lock:
+            journal = self._chat_journal(username)
+            journal.flush()
+            with journal.locked():
+                # Every record in the journal is folded into the empty snapshot
+                snapshot, _ = self._read_chat(journal)
+                snapshot["messages"] = []
+                journal.write_snapshot(snapshot, indent=None)
+                self._set_chat_history(username, [], journal)
+
+    def _compact_chat(self, journal):
+        """Fold one chat journal into its snapshot, rebuilt from the files"""
+        journal.flush()
+        with journal.locked():
+            snapshot, _ = self._read_chat(journal)
+            journal.write_snapshot(snapshot, indent=None)
+
+    def _set_chat_history(self, username, history, journal):
+        """Publish one user's chat history and remember the file state behind it"""
+        chats = dict(self.chats)
+        chats[username] = history
+        self._publish(chats=chats)
+        self._chat_stamps[username] = file_stamp(journal.snapshot_path, journal.path)
+
+    def save_chats(self):
+        """Compact every loaded chat journal into its snapshot"""
+        for username in list(self.chats):
+            self._compact_chat(self._chat_journal(username))
+
+
+def file_stamp(*paths):
+    """Modification time and size of each path, or None for missing files"""
+    stamp = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def shard_name(username):
+    """File name stem of a user's shard"""
+    return "user_" + quote(username, safe="")
+
+
+def split_content(workouts, blobs):
+    """Metadata-only copies of workout entries, their content appended to blobs"""
+    if not workouts:
+        return []
+    refs = blobs.append_many([entry["data"].get("content", "") for entry in workouts])
+    return [
+        {
+            "id": entry["id"],
+            "timestamp": entry["timestamp"],
+            "data": {key: value for key, value in entry["data"].items() if key != "content"},
+            "blob": ref,
+        }
+        for entry, ref in zip(workouts, refs)
+    ]
+
+
+def apply_workout_record(user, record, known_ids):
+    """Apply one journal record to a user, skipping workouts already in the snapshot"""
+    if record.get("op") != "add_workout":
+        return
+    entry = record["entry"]
+    if entry["id"] in known_ids:
+        return
+    user["workouts"].append(entry)
+    known_ids.add(entry["id"])
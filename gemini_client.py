@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class QueueTimeout(Exception):
+    """Raised when a request waited too long for a rate-limit or concurrency slot"""
+
+
+class TokenBucket:
+    """Classic token bucket: refills at rate tokens per second up to capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self):
+        """Take a token if one is available; otherwise return seconds until the next one"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class GeminiClientManager:
+    """Process-wide Gemini models behind one rate limiter and concurrency cap
+
+    Every Streamlit session goes through the same manager, so together they
+    stay under requests_per_minute and max_concurrency. Waiters are served
+    strictly first-come first-served.
+
+    google.generativeai takes about a second to import, so it is imported and
+    configured with api_key when the first model is requested, not at startup.
+    model_factory(model_name) replaces it, e.g. with a local stub.
+    """
+
+    def __init__(self, requests_per_minute=60, max_concurrency=4, burst=None, api_key=None,
+                 model_factory=None):
+        self.api_key = api_key
+        self.model_factory = model_factory
+        self._genai = None
+        self.max_concurrency = max_concurrency
+        self._bucket = TokenBucket(requests_per_minute / 60.0, burst or max_concurrency)
+        self._models = {}
+        self._waiters = deque()
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.requests = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.max_queue_depth = 0
+
+    def get_model(self, model_name):
+        """Reuse one GenerativeModel per model name"""
+        with self._cond:
+            model = self._models.get(model_name)
+            if model is None:
+                if self.model_factory is not None:
+                    model = self.model_factory(model_name)
+                else:
+                    if self._genai is None:
+                        import google.generativeai as genai
+
+                        genai.configure(api_key=self.api_key)
+                        self._genai = genai
+                    model = self._genai.GenerativeModel(model_name)
+                self._models[model_name] = model
+            return model
+
+    def _acquire(self, timeout):
+        """Wait in line for a concurrency slot and a rate-limit token"""
+        ticket = object()
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+
+        with self._cond:
+            self._waiters.append(ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+            try:
+                while True:
+                    wait = None
+                    if self._waiters[0] is ticket and self.in_flight < self.max_concurrency:
+                        wait = self._bucket.try_take()
+                        if wait == 0.0:
+                            break
+
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        self.timeouts += 1
+                        raise QueueTimeout(f"Timed out after {timeout:.0f}s waiting for the Gemini API")
+                    if wait is None or (remaining is not None and remaining < wait):
+                        wait = remaining
+                    self._cond.wait(wait)
+            finally:
+                self._waiters.remove(ticket)
+                self._cond.notify_all()
+
+            self.in_flight += 1
+            self.requests += 1
+            waited = time.monotonic() - start
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def _release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, timeout=None):
+        """Hold a rate-limited slot for the duration of one API call"""
+        self._acquire(timeout)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self):
+        """Queueing metrics for monitoring"""
+        with self._cond:
+            return {
+                "requests": self.requests,
+                "in_flight": self.in_flight,
+                "queued": len(self._waiters),
+                "max_queue_depth": self.max_queue_depth,
+                "timeouts": self.timeouts,
+                "avg_wait_seconds": self.total_wait / self.requests if self.requests else 0.0,
+                "max_wait_seconds": self.max_wait,
+            }
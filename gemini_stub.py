@@ -0,0 +1,209 @@
+import hashlib
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+
+EXERCISES = (
+    "Push-Ups", "Goblet Squat", "Romanian Deadlift", "Plank", "Walking Lunges",
+    "Dumbbell Row", "Overhead Press", "Glute Bridge", "Mountain Climbers", "Burpees",
+    "Kettlebell Swing", "Bicycle Crunch", "Step-Ups", "Pull-Ups", "Jump Rope",
+)
+
+COACH_TIPS = (
+    "Progressive overload matters more than any single exercise choice.",
+    "Aim for roughly 1.6 g of protein per kilogram of body weight spread over the day.",
+    "Sleep is when most of the adaptation to training happens, so protect it.",
+    "Keep most cardio at a pace where you could still hold a conversation.",
+    "Form comes first; add weight only once every rep looks the same.",
+    "Two or three full-body sessions a week are plenty for most beginners.",
+)
+
+PROMPT_FIELD = re.compile(r"- (Workout Type|Target Muscle Group|Duration): (.*)")
+
+
+def prompt_rng(prompt):
+    """Random generator seeded by the prompt, so equal prompts get equal replies"""
+    return random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+
+
+def stub_workout(rng, workout_type="Strength Training", muscle_group="Full Body", duration="30",
+                 exercises=6):
+    """Workout markdown in the shape Gemini produces and the exporters parse"""
+    lines = [
+        f"# {duration}-Minute {workout_type} Workout: {muscle_group}",
+        "",
+        "## Warm-up (5 minutes)",
+        "- Light jog in place: 2 minutes",
+        "- Arm circles and leg swings: 3 minutes",
+        "",
+        "## Main Workout",
+    ]
+    for name in rng.sample(EXERCISES, min(exercises, len(EXERCISES))):
+        lines += [
+            "",
+            f"### {name}",
+            f"- Exercise Name: {name}",
+            f"- Sets: {rng.randint(2, 5)}",
+            f"- Reps: {rng.choice((6, 8, 10, 12, 15))}",
+            f"- Rest: {rng.choice((30, 45, 60, 90))} seconds",
+            "- Notes: Keep a neutral spine and control the lowering phase.",
+        ]
+    lines += [
+        "",
+        "## Cool Down (3 minutes)",
+        "- Hamstring stretch: 1 minute",
+        "- Child's pose: 2 minutes",
+        "",
+        "**Modifications:** Reduce the sets or reps for beginners; add load for advanced lifters.",
+    ]
+    return "\n".join(lines)
+
+
+def stub_reply(prompt):
+    """Deterministic reply: a workout for workout prompts, coaching advice otherwise"""
+    rng = prompt_rng(prompt)
+    if "Generate a detailed workout plan" in prompt:
+        fields = dict(PROMPT_FIELD.findall(prompt))
+        return stub_workout(
+            rng,
+            fields.get("Workout Type", "Strength Training").strip(),
+            fields.get("Target Muscle Group", "Full Body").strip(),
+            fields.get("Duration", "30").split()[0],
+        )
+    return " ".join(rng.sample(COACH_TIPS, 3))
+
+
+class StubApiError(Exception):
+    """Injected API failure; code is the HTTP status the real API would return"""
+
+    def __init__(self, message, code=500):
+        super().__init__(message)
+        self.code = code
+
+
+class StubQuotaError(StubApiError):
+    """Injected quota failure, like the API's 429 ResourceExhausted"""
+
+    def __init__(self, message="Quota exceeded for requests per minute"):
+        super().__init__(message, code=429)
+
+
+def parse_latency(spec):
+    """Function rng -> seconds for a latency spec in milliseconds
+
+    Specs are "200" or "fixed:200", "uniform:100,400" and
+    "lognormal:300,0.5" (median and sigma). An empty spec means no delay.
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return lambda rng: 0.0
+    kind, _, args = spec.partition(":")
+    if not args:
+        kind, args = "fixed", kind
+    values = [float(value) for value in args.split(",")]
+    if kind == "fixed":
+        return lambda rng: values[0] / 1000
+    if kind == "uniform":
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: median * math.exp(rng.gauss(0.0, sigma)) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubBackend:
+    """Deterministic replies with simulated latency, failures and a request quota
+
+    first_chunk_latency and chunk_latency are parse_latency specs.
+    error_rate is the fraction of requests that fail, half of them before the
+    first chunk and half mid-stream. quota_rpm, if set, rejects requests
+    beyond that many in any 60 second window with StubQuotaError.
+    """
+
+    def __init__(self, first_chunk_latency="", chunk_latency="", error_rate=0.0, quota_rpm=None,
+                 chunk_chars=80, seed=None):
+        self.first_chunk_latency = parse_latency(first_chunk_latency)
+        self.chunk_latency = parse_latency(chunk_latency)
+        self.error_rate = error_rate
+        self.quota_rpm = quota_rpm
+        self.chunk_chars = chunk_chars
+        self._rng = random.Random(seed)
+        self._recent = deque()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.quota_errors = 0
+
+    def _admit(self):
+        """Count a request against the quota, raising StubQuotaError if it is used up"""
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            if self.quota_rpm is None:
+                return
+            while self._recent and self._recent[0] <= now - 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.quota_rpm:
+                self.quota_errors += 1
+                raise StubQuotaError()
+            self._recent.append(now)
+
+    def stream(self, prompt):
+        """Yield the reply to prompt in chunks, sleeping and failing as configured"""
+        self._admit()
+        with self._lock:
+            fail = self._rng.random() < self.error_rate
+            fail_at = self._rng.choice((0, 1)) if fail else None
+            first_delay = self.first_chunk_latency(self._rng)
+
+        time.sleep(first_delay)
+        if fail_at == 0:
+            self._fail()
+        text = stub_reply(prompt)
+        chunks = [text[start:start + self.chunk_chars] for start in range(0, len(text), self.chunk_chars)]
+        for i, chunk in enumerate(chunks):
+            if i:
+                with self._lock:
+                    delay = self.chunk_latency(self._rng)
+                time.sleep(delay)
+                if fail_at == 1 and i == len(chunks) // 2:
+                    self._fail()
+            yield chunk
+
+    def _fail(self):
+        with self._lock:
+            self.errors += 1
+            code = self._rng.choice((500, 503))
+        raise StubApiError("Injected server error", code=code)
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors, "quota_errors": self.quota_errors}
+
+
+class StubChunk:
+    """Stands in for one streamed Gemini response chunk"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class StubGenerativeModel:
+    """Offline stand-in for genai.GenerativeModel
+
+    Replies depend only on the prompt; backend (a StubBackend) sets latency,
+    failures and quota, and may be shared by several models.
+    """
+
+    def __init__(self, model_name="stub", backend=None):
+        self.model_name = model_name
+        self.backend = backend or StubBackend()
+
+    def generate_content(self, prompt, stream=False):
+        chunks = (StubChunk(text) for text in self.backend.stream(prompt))
+        if stream:
+            return chunks
+        return StubChunk("".join(chunk.text for chunk in chunks))
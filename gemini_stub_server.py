@@ -0,0 +1,161 @@
+import argparse
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from gemini_stub import StubApiError, StubBackend, StubChunk, StubQuotaError
+
+
+class StubServer:
+    """Serves a StubBackend over HTTP so several app processes share one fake API
+
+    ``POST /v1beta/models/<model>:streamGenerateContent`` with ``{"prompt": ...}``
+    answers with one JSON line per chunk, ``{"text": ...}``. Failures are
+    HTTP errors before the first chunk, or an ``{"error": {"code", "message"}}``
+    line mid-stream. Quota errors are HTTP 429. ``GET /stats`` returns the
+    backend's counters.
+    """
+
+    def __init__(self, backend, port=0, host="127.0.0.1"):
+        backend_ref = backend
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/stats":
+                    self.send_error(404)
+                    return
+                self._send_json(200, backend_ref.stats())
+
+            def do_POST(self):
+                if not self.path.endswith(":streamGenerateContent"):
+                    self.send_error(404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                prompt = json.loads(self.rfile.read(length))["prompt"]
+                chunks = backend_ref.stream(prompt)
+                try:
+                    # The first chunk decides between an HTTP error and a stream
+                    first = next(chunks, None)
+                except StubApiError as e:
+                    self._send_json(e.code, {"error": {"code": e.code, "message": str(e)}})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                try:
+                    if first is not None:
+                        self._send_line({"text": first})
+                    for chunk in chunks:
+                        self._send_line({"text": chunk})
+                except StubApiError as e:
+                    self._send_line({"error": {"code": e.code, "message": str(e)}})
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send_line(self, payload):
+                self.wfile.write(json.dumps(payload).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+            def _send_json(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.backend = backend
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="gemini-stub", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class RemoteStubModel:
+    """genai.GenerativeModel stand-in that streams from a StubServer at url"""
+
+    def __init__(self, url, model_name="stub", timeout=120):
+        self.url = url.rstrip("/")
+        self.model_name = model_name
+        self.timeout = timeout
+
+    def generate_content(self, prompt, stream=False):
+        chunks = self._stream(prompt)
+        if stream:
+            return chunks
+        return StubChunk("".join(chunk.text for chunk in chunks))
+
+    def _stream(self, prompt):
+        request = urllib.request.Request(
+            f"{self.url}/v1beta/models/{self.model_name}:streamGenerateContent",
+            data=json.dumps({"prompt": prompt}).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            response = urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            raise api_error(json.loads(e.read() or b"{}").get("error", {}), e.code) from None
+
+        with response:
+            for line in response:
+                payload = json.loads(line)
+                if "error" in payload:
+                    raise api_error(payload["error"], 500)
+                yield StubChunk(payload["text"])
+
+
+def api_error(error, status):
+    """StubApiError (StubQuotaError for 429) from an error payload"""
+    code = error.get("code", status)
+    if code == 429:
+        return StubQuotaError(error.get("message", "Quota exceeded"))
+    return StubApiError(error.get("message", f"HTTP {code}"), code=code)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local Gemini stand-in for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-chunk", default="lognormal:800,0.4",
+                        help="time to first chunk in ms, e.g. 800, uniform:300,1200, lognormal:800,0.4")
+    parser.add_argument("--chunk", default="uniform:10,40", help="delay between chunks in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--quota-rpm", type=int, default=None, help="requests per minute before 429s")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    backend = StubBackend(
+        first_chunk_latency=args.first_chunk,
+        chunk_latency=args.chunk,
+        error_rate=args.error_rate,
+        quota_rpm=args.quota_rpm,
+        seed=args.seed
+    )
+    server = StubServer(backend, port=args.port, host=args.host)
+    print(f"Gemini stub serving on {server.url}", flush=True)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # No advisory locks on Windows; threads are still serialized
+    fcntl = None
+
+
+class FileLock:
+    """Advisory lock on ``{path}.lock`` held across processes; reentrant within a thread"""
+
+    def __init__(self, path):
+        self.path = f"{path}.lock"
+        self._thread_lock = threading.RLock()
+        self._lock_file = None
+        self._depth = 0
+
+    @contextmanager
+    def locked(self):
+        with self._thread_lock:
+            if self._depth == 0 and fcntl is not None:
+                if self._lock_file is None:
+                    self._lock_file = open(self.path, "a")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+
+class Journal:
+    """Append-only JSON-lines journal that sits next to a JSON snapshot file
+
+    Every write holds an advisory lock on ``{path}.lock``, so processes
+    sharing the files never interleave appends or truncate each other's
+    lines. With a flusher, appends are group-committed by its thread.
+    """
+
+    def __init__(self, path, snapshot_path, compact_every=200, flusher=None):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.compact_every = compact_every
+        self.flusher = flusher
+        self.pending = 0
+        self._file_lock = FileLock(path)
+
+    def locked(self):
+        """Hold the journal's lock across processes; reentrant within a thread
+
+        Hold it around load_snapshot and replay so a compaction by another
+        process cannot land in between.
+        """
+        return self._file_lock.locked()
+
+    def load_snapshot(self, default):
+        """Load the last snapshot, or return default if none has been written yet"""
+        try:
+            with open(self.snapshot_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+
+    def replay(self):
+        """Return the records appended since the last snapshot
+
+        A crash in the middle of an append can leave a partial last line. That
+        torn tail is cut off so the next append starts on a clean line.
+        """
+        records = []
+        good_offset = 0
+        with self.locked():
+            try:
+                with open(self.path, "rb") as f:
+                    for raw in f:
+                        if not raw.endswith(b"\n"):
+                            break
+                        try:
+                            records.append(json.loads(raw))
+                        except ValueError:
+                            break
+                        good_offset += len(raw)
+            except FileNotFoundError:
+                self.pending = 0
+                return records
+
+            if good_offset != os.path.getsize(self.path):
+                with open(self.path, "r+b") as f:
+                    f.truncate(good_offset)
+
+        self.pending = len(records)
+        return records
+
+    def append(self, record):
+        """Append one record; returns True once a compaction is due"""
+        return self.append_many([record])
+
+    def append_many(self, records):
+        """Durably append records; returns True once a compaction is due"""
+        return self.submit(records).wait()
+
+    def submit(self, records):
+        """Start appending records and return a PendingAppend to wait on
+
+        Without a flusher the records are written before this returns. With
+        one they join its next group commit, so a caller can queue records
+        while holding its own lock and wait for durability after releasing it.
+        """
+        if self.flusher is not None:
+            return self.flusher.enqueue(self, records)
+        pending = PendingAppend(self, records)
+        pending.compaction_due = self.write_records(pending.records)
+        pending.done.set()
+        return pending
+
+    def write_records(self, records):
+        """Append records with one write and one fsync; returns True once a compaction is due"""
+        if not records:
+            return False
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        with self.locked():
+            with open(self.path, "a") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending += len(records)
+            return self.pending >= self.compact_every
+
+    def flush(self):
+        """Wait until every append queued on the flusher so far is on disk
+
+        Must not be called while holding locked(); the flusher needs the lock.
+        """
+        if self.flusher is not None:
+            self.flusher.enqueue(self, []).wait()
+
+    def write_snapshot(self, data, indent=4):
+        """Atomically replace the snapshot with data and reset the journal
+
+        The journal is only truncated after the new snapshot is in place, so a
+        crash in between replays records already in the snapshot. Callers make
+        their records idempotent to cover that window.
+        """
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with self.locked():
+            with open(tmp_path, "w") as f:
+                json.dump(data, f, indent=indent)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            with open(self.path, "w") as f:
+                f.flush()
+                os.fsync(f.fileno())
+            self.pending = 0
+
+
+class PendingAppend:
+    """Records waiting for a group commit, and the outcome their writer waits for"""
+
+    def __init__(self, journal, records):
+        self.journal = journal
+        self.records = list(records)
+        self.done = threading.Event()
+        self.compaction_due = False
+        self.error = None
+
+    def wait(self):
+        """Block until the records are on disk; returns True once a compaction is due"""
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.compaction_due
+
+
+class JournalFlusher:
+    """Write-behind thread that group-commits journal appends
+
+    Appends from every session are queued. Once the first one arrives the
+    flusher waits latency seconds for more to join, then writes each
+    journal's share of the batch with a single write and fsync. Writers block
+    until their batch is on disk, so nothing is acknowledged before it is
+    durable, while concurrent saves share one fsync.
+    """
+
+    def __init__(self, latency=0.005):
+        self.latency = latency
+        self.commits = 0
+        self.appends = 0
+        self._queue = []
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="journal-flusher", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, journal, records):
+        """Queue records for journal's next group commit; returns their PendingAppend"""
+        pending = PendingAppend(journal, records)
+        with self._cond:
+            self._queue.append(pending)
+            self._cond.notify()
+        return pending
+
+    def stats(self):
+        return {"commits": self.commits, "appends": self.appends}
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+            # Let appends from other sessions join this commit
+            if self.latency:
+                time.sleep(self.latency)
+            with self._cond:
+                batch, self._queue = self._queue, []
+            self._commit(batch)
+
+    def _commit(self, batch):
+        by_journal = {}
+        for pending in batch:
+            by_journal.setdefault(pending.journal, []).append(pending)
+
+        for journal, group in by_journal.items():
+            writers = [pending for pending in group if pending.records]
+            records = [record for pending in writers for record in pending.records]
+            try:
+                compaction_due = journal.write_records(records)
+                if writers:
+                    self.commits += 1
+                    self.appends += len(writers)
+                    # Only one writer needs to run the compaction
+                    writers[-1].compaction_due = compaction_due
+            except Exception as e:
+                for pending in group:
+                    pending.error = e
+            finally:
+                for pending in group:
+                    pending.done.set()
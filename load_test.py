@@ -0,0 +1,431 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from tornado.httpclient import AsyncHTTPClient
+from tornado.websocket import websocket_connect
+
+from benchmark import write_dataset
+from gemini_stub import StubBackend
+from gemini_stub_server import StubServer
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Concurrent sessions per load level
+DEFAULT_LEVELS = (1, 2, 4, 8, 16)
+
+# A level saturates the server when it adds less than this much throughput
+SATURATION_GAIN = 1.10
+
+# Steps of one user visit, in order
+STEPS = ("login", "open_generate", "generate", "save", "history", "open_coach", "coach_chat")
+
+# Error messages the app shows (with st.error) when a call failed
+APP_ERRORS = ("Error generating workout", "Error communicating with fitness coach", "Error creating PDF")
+
+
+class StepFailed(Exception):
+    """A step timed out, hit an exception on the page, or found the page unexpected"""
+
+
+class Page:
+    """Widgets and text of one finished script run"""
+
+    def __init__(self):
+        self.widgets = []
+        self.texts = []
+        self.alerts = []
+        self.exceptions = []
+
+    def add_element(self, element):
+        kind = element.WhichOneof("type")
+        if kind in ("button", "text_input", "text_area", "checkbox", "selectbox", "slider", "multiselect"):
+            widget = getattr(element, kind)
+            self.widgets.append((kind, widget.label, widget.id, widget.form_id))
+        elif kind == "markdown":
+            self.texts.append(element.markdown.body)
+        elif kind == "alert":
+            self.texts.append(element.alert.body)
+            self.alerts.append(element.alert.body)
+        elif kind == "heading":
+            self.texts.append(element.heading.body)
+        elif kind == "exception":
+            self.exceptions.append(f"{element.exception.type}: {element.exception.message}")
+
+    def widget_id(self, kind, label, in_form=None):
+        """Id of the widget with this kind and label; in_form picks form or non-form widgets"""
+        for widget_kind, widget_label, widget_id, form_id in self.widgets:
+            if widget_kind != kind or widget_label != label:
+                continue
+            if in_form is not None and bool(form_id) != in_form:
+                continue
+            return widget_id
+        raise StepFailed(f"No {kind} labelled {label!r} on the page")
+
+    def app_error(self):
+        """The first error message the app showed, or None
+
+        Only alerts count: failed replies saved to the chat history by older
+        versions of the app are ordinary text.
+        """
+        for text in self.alerts:
+            for error in APP_ERRORS:
+                if error in text:
+                    return error
+        return None
+
+    def no_error(self):
+        return None
+
+
+class Session:
+    """One browser tab: a websocket to the Streamlit server that replays widget interactions
+
+    Speaks the same protobuf protocol as the Streamlit frontend, so the server
+    does exactly the work a real user causes.
+    """
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.connection = None
+        self.page_script_hash = ""
+        self.page = None
+
+    async def connect(self):
+        ws_url = self.base_url.replace("http", "ws", 1) + "/_stcore/stream"
+        self.connection = await websocket_connect(ws_url, max_message_size=256 * 1024 * 1024)
+        return await self.rerun()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    async def rerun(self, widget_states=()):
+        """Rerun the script with these widget values and wait for it to finish"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = self.page_script_hash
+        for widget_id, field, value in widget_states:
+            state = WidgetState(id=widget_id)
+            setattr(state, field, value)
+            msg.rerun_script.widget_states.widgets.append(state)
+        await self.connection.write_message(msg.SerializeToString(), binary=True)
+        self.page = await asyncio.wait_for(self._read_run(), self.timeout)
+        if self.page.exceptions:
+            raise StepFailed(self.page.exceptions[0])
+        return self.page
+
+    async def _read_run(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        page = Page()
+        while True:
+            data = await self.connection.read_message()
+            if data is None:
+                raise StepFailed("Server closed the connection")
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            if msg.WhichOneof("type") == "ref_hash":
+                msg = await self._fetch_cached(msg.ref_hash)
+
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                # Every run, including those started by st.rerun, begins here
+                page = Page()
+                self.page_script_hash = msg.new_session.page_script_hash
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                page.add_element(msg.delta.new_element)
+            elif kind == "script_finished":
+                if msg.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise StepFailed("Script failed to compile")
+                if msg.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+                    return page
+
+    async def _fetch_cached(self, ref_hash):
+        """Messages the server thinks we cached are fetched by hash, like the frontend does"""
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        response = await AsyncHTTPClient().fetch(f"{self.base_url}/_stcore/message?hash={ref_hash}")
+        msg = ForwardMsg()
+        msg.ParseFromString(response.body)
+        return msg
+
+    async def click(self, label, in_form=None):
+        widget_id = self.page.widget_id("button", label, in_form)
+        return await self.rerun([(widget_id, "trigger_value", True)])
+
+
+async def visit(base_url, username, password, fresh_workouts, timeout, record):
+    """Log in, generate and save a workout, open the history, and ask the coach one question
+
+    record(step, seconds, error) is called for every step; a failed step ends the visit.
+    """
+    session = Session(base_url, timeout)
+
+    async def step(name, action, check):
+        start = time.perf_counter()
+        try:
+            page = await action()
+            error = check(page)
+            if error:
+                raise StepFailed(error)
+        except (StepFailed, asyncio.TimeoutError, OSError) as e:
+            record(name, time.perf_counter() - start, str(e) or type(e).__name__)
+            return False
+        record(name, time.perf_counter() - start, None)
+        return True
+
+    async def login():
+        page = await session.connect()
+        return await session.rerun([
+            (page.widget_id("text_input", "Username"), "string_value", username),
+            (page.widget_id("text_input", "Password"), "string_value", password),
+            (page.widget_id("button", "Login"), "trigger_value", True),
+        ])
+
+    async def generate():
+        page = session.page
+        return await session.rerun([
+            (page.widget_id("checkbox", "Always generate a fresh workout"), "bool_value", fresh_workouts),
+            (page.widget_id("button", "Generate Workout", in_form=True), "trigger_value", True),
+        ])
+
+    async def coach_chat():
+        page = session.page
+        return await session.rerun([
+            (page.widget_id("text_input", "Your question:"), "string_value",
+             f"How many rest days should I take? ({random.randint(1, 10 ** 6)})"),
+            (page.widget_id("button", "Ask Coach"), "trigger_value", True),
+        ])
+
+    try:
+        for name, action, check in (
+            ("login", login, Page.app_error),
+            ("open_generate", lambda: session.click("Generate Workout", in_form=False), Page.app_error),
+            ("generate", generate, Page.app_error),
+            ("save", lambda: session.click("Save to History"), Page.app_error),
+            ("history", lambda: session.click("Workout History"), Page.no_error),
+            ("open_coach", lambda: session.click("Fitness Coach"), Page.no_error),
+            ("coach_chat", coach_chat, Page.app_error),
+        ):
+            if not await step(name, action, check):
+                return False
+        return True
+    finally:
+        session.close()
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def latency_summary(seconds):
+    values = sorted(seconds)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.50) * 1000 if values else None,
+        "p95_ms": percentile(values, 0.95) * 1000 if values else None,
+        "p99_ms": percentile(values, 0.99) * 1000 if values else None,
+    }
+
+
+async def run_level(base_url, sessions, duration, accounts, fresh_workouts, timeout):
+    """sessions concurrent users repeating visits for duration seconds"""
+    steps = {name: [] for name in STEPS}
+    errors = {}
+    visits = []
+    deadline = time.monotonic() + duration
+
+    def record(step, seconds, error):
+        if error is None:
+            steps[step].append(seconds)
+        else:
+            errors.setdefault(step, []).append(error)
+
+    async def user(index):
+        username, password = accounts[index % len(accounts)]
+        # Spread the first logins out a little, like real arrivals
+        await asyncio.sleep(random.uniform(0, 1))
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            if await visit(base_url, username, password, fresh_workouts, timeout, record):
+                visits.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "visits": len(visits),
+        "visits_per_s": len(visits) / elapsed,
+        "steps_per_s": sum(len(values) for values in steps.values()) / elapsed,
+        "visit_latency": latency_summary(visits),
+        "step_latency": {name: latency_summary(values) for name, values in steps.items()},
+        "errors": {name: len(messages) for name, messages in errors.items()},
+        "error_samples": {name: sorted(set(messages))[:3] for name, messages in errors.items()},
+    }
+
+
+def saturation_point(levels):
+    """First session count that added less than SATURATION_GAIN throughput, or None"""
+    for before, after in zip(levels, levels[1:]):
+        if after["visits_per_s"] < before["visits_per_s"] * SATURATION_GAIN:
+            return before["sessions"]
+    return None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_app(directory, stub_url, port):
+    """Run the app under ``streamlit run`` in directory and wait until it is healthy"""
+    env = dict(os.environ, GEMINI_STUB_URL=stub_url)
+    # Without a key the app shows an error on every page
+    env.setdefault("GEMINI_API_KEY", "stub")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(APP_DIR, "app.py"),
+         "--server.headless", "true", "--server.port", str(port),
+         "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+        cwd=directory,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"streamlit exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.25)
+    process.terminate()
+    raise RuntimeError("streamlit did not become healthy within 60s")
+
+
+def print_report(report):
+    print(f"{'sessions':>8} {'visits/s':>9} {'steps/s':>8} {'visit p50':>10} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for level in report["levels"]:
+        latency = level["visit_latency"]
+        cells = [
+            f"{latency[key] / 1000:7.2f}s" if latency[key] is not None else f"{'-':>8}"
+            for key in ("p50_ms", "p95_ms", "p99_ms")
+        ]
+        print(f"{level['sessions']:>8} {level['visits_per_s']:9.2f} {level['steps_per_s']:8.2f} "
+              f"{cells[0]:>10} {cells[1]:>8} {cells[2]:>8} {sum(level['errors'].values()):>7}")
+
+    last = report["levels"][-1]
+    print(f"\nStep latency at {last['sessions']} sessions (ms):")
+    for name, latency in last["step_latency"].items():
+        if latency["count"]:
+            print(f"  {name:14} p50 {latency['p50_ms']:8.0f}  p95 {latency['p95_ms']:8.0f}  "
+                  f"p99 {latency['p99_ms']:8.0f}  ({latency['count']})")
+    for level in report["levels"]:
+        for name, samples in level["error_samples"].items():
+            print(f"  errors in {name} @ {level['sessions']} sessions: {'; '.join(samples)}")
+
+    saturation = report["saturation_sessions"]
+    print()
+    if len(report["levels"]) < 2:
+        print("Run at least two levels to find the saturation point")
+    elif saturation is None:
+        print("No saturation point: throughput still grew at the highest level")
+    else:
+        print(f"Saturation: throughput stops growing beyond {saturation} concurrent sessions")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Drive concurrent Streamlit sessions against the app with a local Gemini stand-in"
+    )
+    parser.add_argument("--levels", default=",".join(map(str, DEFAULT_LEVELS)),
+                        help="comma-separated concurrent session counts")
+    parser.add_argument("--duration", type=float, default=60, help="seconds per level")
+    parser.add_argument("--accounts", type=int, default=20, help="synthetic user accounts")
+    parser.add_argument("--workouts", type=int, default=50, help="saved workouts per account")
+    parser.add_argument("--cached", action="store_true", help="let repeated workout requests hit the response cache")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a step counts as failed")
+    parser.add_argument("--first-chunk", default="lognormal:800,0.4", help="stub time to first chunk, ms")
+    parser.add_argument("--chunk", default="uniform:10,40", help="stub delay between chunks, ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub requests that fail")
+    parser.add_argument("--quota-rpm", type=int, default=None, help="stub requests per minute before 429s")
+    parser.add_argument("--stub-url", default=None, help="use a running gemini_stub_server.py instead")
+    parser.add_argument("--output", default=None, help="JSON results file")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.levels.split(",")]
+    accounts = [(f"load{i:03d}", f"pw{i:03d}") for i in range(args.accounts)]
+
+    stub = None
+    stub_url = args.stub_url
+    if stub_url is None:
+        stub = StubServer(StubBackend(
+            first_chunk_latency=args.first_chunk,
+            chunk_latency=args.chunk,
+            error_rate=args.error_rate,
+            quota_rpm=args.quota_rpm
+        )).start()
+        stub_url = stub.url
+
+    with tempfile.TemporaryDirectory(prefix="fitness_load_") as directory:
+        write_dataset(directory, args.workouts, 20, accounts=dict(accounts))
+        port = free_port()
+        app = start_app(directory, stub_url, port)
+        try:
+            results = []
+            for sessions in levels:
+                print(f"Running {sessions} concurrent sessions for {args.duration:.0f}s...",
+                      file=sys.stderr, flush=True)
+                results.append(asyncio.run(run_level(
+                    f"http://127.0.0.1:{port}", sessions, args.duration, accounts,
+                    not args.cached, args.timeout
+                )))
+        finally:
+            app.terminate()
+            app.wait()
+            if stub is not None:
+                stub.stop()
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "levels": results,
+        "saturation_sessions": saturation_point(results),
+        "stub": stub.backend.stats() if stub is not None else None,
+    }
+    print_report(report)
+
+    output = args.output or os.path.join("load_results", f"load_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
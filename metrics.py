@@ -0,0 +1,289 @@
+import cProfile
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Every metric name gets this prefix in the exported text
+PREFIX = "fitness_"
+
+# Bucket upper bounds for latencies (seconds) and prompt/response sizes (characters)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000)
+
+
+def label_text(labels):
+    """Prometheus label set for a sorted (name, value) tuple"""
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+class Histogram:
+    """Fixed-bucket histogram; counts[i] holds observations up to buckets[i], the last one the rest"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (the last bound for overflow)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+class Metrics:
+    """Process-wide counters and histograms with a Prometheus text rendering
+
+    Gauges are read on demand from registered stats() callables, so caches
+    and clients keep their own counters and are not slowed by this class.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self._gauge_sources = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=LATENCY_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def add_gauges(self, prefix, stats):
+        """Export every number in the dict stats() returns as a gauge named prefix_key"""
+        with self._lock:
+            self._gauge_sources[prefix] = stats
+
+    @contextmanager
+    def timer(self, op):
+        """Record the duration of the block as operation_seconds and count its errors
+
+        Streamlit's st.rerun and st.stop exceptions are not Exceptions, so
+        they are timed but not counted as errors.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("errors_total", op=op)
+            raise
+        finally:
+            self.observe("operation_seconds", time.perf_counter() - start, op=op)
+
+    def timed_stream(self, op, chunks):
+        """Pass chunks through, recording time to first chunk, total time, size and errors"""
+        start = time.perf_counter()
+        size = 0
+        first = True
+        try:
+            for chunk in chunks:
+                if first:
+                    self.observe("first_chunk_seconds", time.perf_counter() - start, op=op)
+                    first = False
+                size += len(chunk)
+                yield chunk
+        except Exception:
+            self.inc("errors_total", op=op)
+            raise
+        finally:
+            self.observe("operation_seconds", time.perf_counter() - start, op=op)
+            self.observe("response_chars", size, buckets=SIZE_BUCKETS, op=op)
+
+    def _gauges(self):
+        gauges = []
+        for prefix, stats in list(self._gauge_sources.items()):
+            try:
+                values = stats()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges.append((f"{prefix}_{key}", value))
+        return gauges
+
+    def render(self):
+        """Metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(self.histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.buckets), list(h.counts), h.sum, h.count) for key, h in histograms]
+
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                typed.add(name)
+            lines.append(f"{PREFIX}{name}{label_text(labels)} {value}")
+
+        for (name, labels), buckets, counts, total, count in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = labels + (("le", bound),)
+                lines.append(f"{PREFIX}{name}_bucket{label_text(bucket_labels)} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{label_text(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{PREFIX}{name}_sum{label_text(labels)} {total}")
+            lines.append(f"{PREFIX}{name}_count{label_text(labels)} {count}")
+
+        for name, value in self._gauges():
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Compact JSON-friendly view: counters, histogram count/sum/p50/p95/p99 and gauges"""
+        with self._lock:
+            counters = {
+                f"{name}{label_text(labels)}": value
+                for (name, labels), value in self.counters.items()
+            }
+            histograms = {
+                f"{name}{label_text(labels)}": {
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "p99": h.quantile(0.99),
+                }
+                for (name, labels), h in self.histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms, "gauges": dict(self._gauges())}
+
+
+class MetricsServer:
+    """Serves ``GET /metrics`` on a local port from a daemon thread"""
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        metrics_ref = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics_ref.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-server", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+
+class MetricsLog:
+    """Appends a JSON summary line to a size-rotated log file every interval seconds"""
+
+    def __init__(self, metrics, path, interval=60, max_bytes=5 * 1024 * 1024, backups=3):
+        self.metrics = metrics
+        self.interval = interval
+        self.logger = logging.getLogger(f"metrics.{path}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.logger.addHandler(handler)
+        self._thread = threading.Thread(target=self._run, name="metrics-log", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def write(self):
+        self.logger.info(json.dumps(self.metrics.summary(), sort_keys=True))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.write()
+
+
+class RerunProfiler:
+    """Opt-in cProfile capture of reruns slower than threshold seconds
+
+    Each rerun runs under its own profiler; only slow ones are written to
+    out_dir as .prof files (open them with pstats or snakeviz). The oldest
+    files are removed beyond keep.
+    """
+
+    def __init__(self, threshold, out_dir, keep=20):
+        self.threshold = threshold
+        self.out_dir = out_dir
+        self.keep = keep
+        self.captured = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    def run(self, func, label="rerun"):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is active in this thread; run without one
+            return func()
+        start = time.perf_counter()
+        try:
+            return func()
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            if elapsed >= self.threshold:
+                self._save(profiler, label, elapsed)
+
+    def _save(self, profiler, label, elapsed):
+        stamp = time.strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.out_dir, f"{label}_{stamp}_{elapsed * 1000:.0f}ms.prof")
+        profiler.dump_stats(path)
+        self.captured += 1
+
+        profiles = sorted(
+            (os.path.join(self.out_dir, name) for name in os.listdir(self.out_dir) if name.endswith(".prof")),
+            key=os.path.getmtime
+        )
+        for old in profiles[:-self.keep]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
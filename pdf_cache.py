@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def workout_pdf_key(workout_id, workout_data):
+    """Cache key that changes whenever the workout's content changes"""
+    digest = hashlib.sha256(
+        json.dumps(workout_data, sort_keys=True).encode("utf-8")
+    ).hexdigest()[:16]
+    return f"{workout_id}-{digest}"
+
+
+class PdfCache:
+    """Size-bounded cache of rendered PDFs in memory and on disk
+
+    Both tiers evict the least recently used PDFs once they exceed their byte
+    budget. Disk recency is tracked by file mtime, which is refreshed on hit.
+    """
+
+    def __init__(self, cache_dir, max_memory_bytes=32 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def get(self, key):
+        """Return cached PDF bytes, or None if this PDF has not been rendered"""
+        with self._lock:
+            pdf_bytes = self._memory.get(key)
+            if pdf_bytes is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return pdf_bytes
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                pdf_bytes = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self._remember(key, pdf_bytes)
+            self.hits += 1
+            self.disk_hits += 1
+        return pdf_bytes
+
+    def get_or_render(self, key, render):
+        """Return the cached PDF for key, calling render() to create it on a miss"""
+        pdf_bytes = self.get(key)
+        if pdf_bytes is None:
+            pdf_bytes = render()
+            self.put(key, pdf_bytes)
+        return pdf_bytes
+
+    def put(self, key, pdf_bytes):
+        """Store a rendered PDF in both tiers"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._remember(key, pdf_bytes)
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(pdf_bytes)
+        self._evict_disk()
+
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_bytes": self._memory_bytes,
+            }
+
+    def _remember(self, key, pdf_bytes):
+        """Put a PDF in the memory tier, evicting the least recently used"""
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = pdf_bytes
+        self._memory_bytes += len(pdf_bytes)
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        """Delete the least recently used PDFs once the directory is over budget"""
+        with self._lock:
+            if self._disk_bytes is not None and self._disk_bytes <= self.max_disk_bytes:
+                return
+
+            files = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            files.sort()
+
+            # Trim to 90% of the budget so the directory is not rescanned on every put
+            total = sum(size for _, size, _ in files)
+            target = self.max_disk_bytes * 9 // 10 if total > self.max_disk_bytes else total
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._disk_bytes = total
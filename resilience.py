@@ -0,0 +1,355 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+# HTTP statuses worth retrying; 429 is retried too, after a longer backoff
+RETRYABLE_CODES = {408, 500, 502, 503, 504}
+THROTTLED_CODE = 429
+
+TRANSIENT = "transient"
+THROTTLED = "throttled"
+PERMANENT = "permanent"
+
+
+class DeadlineExceeded(Exception):
+    """The upstream did not answer within the call's deadline"""
+
+    code = 504
+
+
+class CircuitOpen(Exception):
+    """The circuit breaker is failing calls fast while the upstream is unhealthy"""
+
+
+class EmptyResponse(Exception):
+    """The upstream finished without any text, e.g. every chunk was blocked by the safety filters"""
+
+
+def classify_error(error):
+    """TRANSIENT, THROTTLED or PERMANENT, from the error type or its HTTP status
+
+    google.api_core errors and the stub's errors both carry the HTTP status
+    as ``code``.
+    """
+    if isinstance(error, (DeadlineExceeded, TimeoutError, ConnectionError)):
+        return TRANSIENT
+    code = getattr(error, "code", None)
+    if code == THROTTLED_CODE:
+        return THROTTLED
+    if code in RETRYABLE_CODES:
+        return TRANSIENT
+    return PERMANENT
+
+
+def is_upstream_error(error):
+    """Whether error came from the API rather than from this process, e.g. a local queue timeout"""
+    return isinstance(error, (DeadlineExceeded, TimeoutError, ConnectionError)) or hasattr(error, "code")
+
+
+def backoff_delay(retry, base, cap, rng=random):
+    """Full-jitter exponential backoff before the given retry (1-based)"""
+    return rng.uniform(0, min(cap, base * 2 ** (retry - 1)))
+
+
+class CircuitBreaker:
+    """Fails calls fast after failure_threshold consecutive upstream failures
+
+    Once reset_timeout seconds have passed, one trial call is let through
+    (half-open): its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go upstream now"""
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release(self):
+        """End a call that neither succeeded nor failed upstream, e.g. one the caller abandoned"""
+        with self._lock:
+            self._trial_running = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": 1 if self.state == "open" else 0,
+                "half_open": 1 if self.state == "half_open" else 0,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+class LatencyTracker:
+    """Recent time-to-first-chunk samples, for the hedging threshold"""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q, min_samples=20):
+        """The q-th percentile (0-100) of recent samples, or None with fewer than min_samples"""
+        with self._lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+class Attempt:
+    """Handed to start() for each upstream attempt
+
+    start should skip the call if cancelled is set once it gets a slot,
+    call mark_sent() just before sending the request, and stop reading
+    once cancelled is set. hedge is True for a hedged duplicate, which
+    should not wait for capacity.
+    """
+
+    def __init__(self, attempt_id, hedge, events):
+        self.attempt_id = attempt_id
+        self.hedge = hedge
+        self.cancelled = threading.Event()
+        self._events = events
+
+    def mark_sent(self):
+        self._events.put((self, "sent", time.monotonic()))
+
+
+class ResilientStreamer:
+    """Streams from an upstream with deadlines, retries, optional hedging and a circuit breaker
+
+    stream(start) calls start(attempt) for each attempt; it must return a
+    fresh iterable of text chunks. Attempts run in their own threads, so a
+    hung upstream never holds the caller past its deadline.
+
+    deadline bounds the whole call, first_chunk_timeout the wait for the
+    first chunk once a request is sent. Transient and throttled failures
+    are retried with full-jitter backoff, but only before the first chunk:
+    text already passed on is never replayed. With hedge_percentile set, a
+    second request is sent when the first has produced nothing within that
+    percentile of recent first-chunk latencies, and the faster one wins.
+    """
+
+    def __init__(self, deadline=120.0, first_chunk_timeout=30.0, max_attempts=3,
+                 backoff_base=0.5, throttled_backoff_base=4.0, backoff_cap=10.0,
+                 hedge_percentile=None, breaker=None, rng=None):
+        self.deadline = deadline
+        self.first_chunk_timeout = first_chunk_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.throttled_backoff_base = throttled_backoff_base
+        self.backoff_cap = backoff_cap
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.first_chunk_latency = LatencyTracker()
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadlines_exceeded = 0
+        self.failures = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stream(self, start):
+        """Yield the upstream's chunks, retrying and hedging as configured"""
+        self._count("calls")
+        deadline = time.monotonic() + self.deadline
+        retry = 0
+        while True:
+            if not self.breaker.allow():
+                self._count("failures")
+                raise CircuitOpen("The Gemini API is failing; not calling it for now")
+            outcome = "abandoned"
+            try:
+                yield from self._attempt(start, deadline)
+                outcome = "success"
+            except _FailedBeforeOutput as e:
+                error = e.error
+                outcome = "failure" if is_upstream_error(error) else "abandoned"
+                kind = classify_error(error)
+                if kind == PERMANENT or retry + 1 >= self.max_attempts:
+                    self._count("failures")
+                    raise error
+                retry += 1
+                base = self.throttled_backoff_base if kind == THROTTLED else self.backoff_base
+                delay = backoff_delay(retry, base, self.backoff_cap, self._rng)
+                if time.monotonic() + delay >= deadline:
+                    self._count("failures")
+                    raise error
+                self._count("retries")
+            except Exception:
+                outcome = "failure"
+                self._count("failures")
+                raise
+            finally:
+                if outcome == "success":
+                    self.breaker.record_success()
+                elif outcome == "failure":
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+            if outcome == "success":
+                return
+            time.sleep(delay)
+
+    def _attempt(self, start, deadline):
+        """Run one attempt, plus a hedge if it is slow, and yield the winner's chunks"""
+        events = queue.Queue()
+        attempts = [self._launch(start, 0, False, events)]
+        sent_at = {}
+        failed = {}
+        winner = None
+        try:
+            while winner is None:
+                # Until the first request is sent it is queued locally, bounded by its own queue timeout
+                give_up_at = deadline
+                hedge_at = None
+                if attempts[0] in sent_at:
+                    give_up_at = min(deadline, sent_at[attempts[0]] + self.first_chunk_timeout)
+                    if len(attempts) == 1:
+                        hedge_at = self._hedge_at(sent_at[attempts[0]])
+                wake_at = give_up_at if hedge_at is None else min(give_up_at, hedge_at)
+                try:
+                    attempt, kind, value = events.get(timeout=max(0.0, wake_at - time.monotonic()))
+                except queue.Empty:
+                    if time.monotonic() < give_up_at:
+                        self._count("hedges")
+                        attempts.append(self._launch(start, 1, True, events))
+                        continue
+                    self._count("deadlines_exceeded")
+                    raise _FailedBeforeOutput(DeadlineExceeded("Timed out waiting for the Gemini API to answer"))
+
+                if kind == "sent":
+                    sent_at[attempt] = value
+                elif kind == "chunk":
+                    winner = attempt
+                    self.first_chunk_latency.add(time.monotonic() - sent_at.get(attempt, time.monotonic()))
+                    if attempt.hedge:
+                        self._count("hedge_wins")
+                    for other in attempts:
+                        if other is not winner:
+                            other.cancelled.set()
+                    yield value
+                elif kind == "done":
+                    # Nothing but empty chunks: not retried, and not a success to cache
+                    raise _FailedBeforeOutput(EmptyResponse("The Gemini API returned an empty reply"))
+                else:
+                    failed[attempt] = value
+                    # A failed hedge (often just no free slot) leaves the first attempt running
+                    if len(failed) == len(attempts):
+                        raise _FailedBeforeOutput(failed[attempts[0]])
+
+            while True:
+                try:
+                    attempt, kind, value = events.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    self._count("deadlines_exceeded")
+                    raise DeadlineExceeded("Timed out waiting for the rest of the Gemini reply") from None
+                if attempt is not winner:
+                    continue
+                if kind == "chunk":
+                    yield value
+                elif kind == "done":
+                    return
+                elif kind == "error":
+                    raise value
+        finally:
+            for attempt in attempts:
+                attempt.cancelled.set()
+
+    def _hedge_at(self, sent):
+        if self.hedge_percentile is None:
+            return None
+        threshold = self.first_chunk_latency.percentile(self.hedge_percentile)
+        return None if threshold is None else sent + threshold
+
+    def _launch(self, start, attempt_id, hedge, events):
+        attempt = Attempt(attempt_id, hedge, events)
+        threading.Thread(
+            target=self._run, args=(attempt, start, events), name="gemini-attempt", daemon=True
+        ).start()
+        return attempt
+
+    @staticmethod
+    def _run(attempt, start, events):
+        chunks = iter(start(attempt))
+        try:
+            for chunk in chunks:
+                if attempt.cancelled.is_set():
+                    return
+                events.put((attempt, "chunk", chunk))
+        except Exception as e:
+            events.put((attempt, "error", e))
+        else:
+            events.put((attempt, "done", None))
+        finally:
+            # Release the upstream connection and slot of an abandoned attempt now
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    def stats(self):
+        """Retry, hedge and breaker counters for monitoring"""
+        with self._lock:
+            stats = {
+                "calls": self.calls,
+                "retries": self.retries,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "deadlines_exceeded": self.deadlines_exceeded,
+                "failures": self.failures,
+            }
+        stats.update({f"breaker_{key}": value for key, value in self.breaker.stats().items()})
+        return stats
+
+
+class _FailedBeforeOutput(Exception):
+    """Internal: an attempt failed before yielding anything, so it may be retried"""
+
+    def __init__(self, error):
+        self.error = error
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_text(value):
+    """Lowercase and collapse whitespace so trivially different inputs share a key"""
+    return " ".join(str(value).lower().split())
+
+
+def make_cache_key(*parts):
+    """Stable hex digest of the normalized key parts"""
+    normalized = json.dumps([normalize_text(part) for part in parts])
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier LRU/TTL cache for model responses
+
+    Recently used entries stay in an in-memory LRU. Every entry is also written
+    to cache_dir as a small JSON file, so responses survive restarts and are
+    shared between server processes. Both tiers expire entries after
+    ttl_seconds and evict the least recently used ones when they are full.
+    """
+
+    def __init__(self, cache_dir, max_memory_entries=256, max_disk_entries=5000, ttl_seconds=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._memory = OrderedDict()
+        self._disk_count = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        try:
+            with open(self._path(key), "r") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            entry = None
+
+        with self._lock:
+            if entry is None or entry["expires_at"] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, entry["expires_at"], entry["value"])
+
+        # Touch the file so disk eviction treats it as recently used
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+        return entry["value"]
+
+    def set(self, key, value):
+        """Store value under key in both tiers"""
+        expires_at = time.time() + self.ttl_seconds
+        path = self._path(key)
+        is_new = not os.path.exists(path)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"expires_at": expires_at, "value": value}, f)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if is_new and self._disk_count is not None:
+                self._disk_count += 1
+        self._evict_disk()
+
+    def _remember(self, key, expires_at, value):
+        """Put an entry in the memory tier, evicting the least recently used"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        """Drop expired files, then the least recently used ones over the limit"""
+        with self._lock:
+            if self._disk_count is not None and self._disk_count <= self.max_disk_entries:
+                return
+
+            now = time.time()
+            files = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".json"):
+                    files.append((entry.stat().st_mtime, entry.path))
+            files.sort()
+
+            # Files are touched on every hit, so mtime + ttl bounds their expiry
+            keep = []
+            for mtime, path in files:
+                if mtime + self.ttl_seconds <= now:
+                    self._remove(path)
+                else:
+                    keep.append(path)
+            # Trim below the limit so the directory is not rescanned on every set
+            if len(keep) > self.max_disk_entries:
+                excess = len(keep) - self.max_disk_entries * 9 // 10
+                for path in keep[:excess]:
+                    self._remove(path)
+                keep = keep[excess:]
+            self._disk_count = len(keep)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+            self.evictions += 1
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        """Hit/miss counters for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
@@ -0,0 +1,165 @@
+import math
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+
+from journal import Journal
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in is it of on or the to with my me i".split()
+)
+
+MONTHS = [
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+]
+
+
+def tokenize(text):
+    """Lowercase word tokens without stopwords"""
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def date_tokens(timestamp):
+    """Year and month-name tokens for a "YYYY-MM-DD HH:MM:SS" timestamp"""
+    year, month = timestamp[:4], int(timestamp[5:7])
+    name = MONTHS[month - 1]
+    return [year, name, name[:3]]
+
+
+class SearchIndex:
+    """Incremental BM25 inverted index persisted as an append-only journal
+
+    Nothing is read from disk until the first search. Each added
+    document is one journal record holding its term frequencies; the journal
+    is folded into a snapshot every compact_every documents.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, path, compact_every=500):
+        self.journal = Journal(f"{path}.journal", f"{path}.json", compact_every)
+        self.loaded = False
+        self.doc_lengths = {}
+        self.postings = {}
+        self.terms = []
+        self.total_length = 0
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.journal.path) or os.path.exists(self.journal.snapshot_path)
+
+    def _load(self):
+        if self.loaded:
+            return
+        with self.journal.locked():
+            snapshot = self.journal.load_snapshot({"docs": {}})
+            records = self.journal.replay()
+        for doc_id, (length, frequencies) in snapshot["docs"].items():
+            self._index(doc_id, length, frequencies)
+        for record in records:
+            self._index(record["id"], record["len"], record["tf"])
+        self.terms = sorted(self.postings)
+        self.loaded = True
+
+    def _index(self, doc_id, length, frequencies):
+        if doc_id in self.doc_lengths:
+            return
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        for term, count in frequencies.items():
+            postings = self.postings.get(term)
+            if postings is None:
+                postings = self.postings[term] = {}
+                if self.loaded:
+                    insort(self.terms, term)
+            postings[doc_id] = count
+
+    def add(self, doc_id, text, extra_tokens=()):
+        """Index one document and append it to the journal"""
+        self.add_many([(doc_id, text, extra_tokens)])
+
+    def add_many(self, documents):
+        """Index (doc_id, text, extra_tokens) triples with a single journal write
+
+        If the index has not been loaded yet, the records are only appended;
+        they are picked up by the next load.
+        """
+        records = []
+        for doc_id, text, extra_tokens in documents:
+            tokens = tokenize(text) + list(extra_tokens)
+            records.append({"id": doc_id, "len": len(tokens), "tf": dict(Counter(tokens))})
+
+        with self._lock:
+            if self.loaded:
+                records = [record for record in records if record["id"] not in self.doc_lengths]
+                for record in records:
+                    self._index(record["id"], record["len"], record["tf"])
+            if not records:
+                return
+            compaction_due = self.journal.append_many(records)
+            if compaction_due and self.loaded:
+                self.journal.write_snapshot({"docs": self._documents()}, indent=None)
+
+    def clear(self):
+        """Drop every document, on disk and in memory"""
+        with self._lock:
+            self.doc_lengths = {}
+            self.postings = {}
+            self.terms = []
+            self.total_length = 0
+            self.journal.write_snapshot({"docs": {}}, indent=None)
+            self.loaded = True
+
+    def _documents(self):
+        """Invert the postings back into per-document term frequencies"""
+        docs = {doc_id: [length, {}] for doc_id, length in self.doc_lengths.items()}
+        for term, postings in self.postings.items():
+            for doc_id, count in postings.items():
+                docs[doc_id][1][term] = count
+        return docs
+
+    def _expand(self, token):
+        """Indexed terms starting with token"""
+        start = bisect_left(self.terms, token)
+        end = start
+        while end < len(self.terms) and self.terms[end].startswith(token):
+            end += 1
+        return self.terms[start:end]
+
+    def search(self, query, limit=20, prefix=True):
+        """Best matching doc ids with BM25 scores, highest first
+
+        With prefix on, every query token also matches longer indexed terms
+        ("kettle" finds "kettlebell"), scored slightly lower than exact hits.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            self._load()
+            doc_count = len(self.doc_lengths)
+            if doc_count == 0:
+                return []
+            average_length = self.total_length / doc_count
+
+            scores = Counter()
+            for token in tokens:
+                terms = self._expand(token) if prefix else [token]
+                for term in terms:
+                    postings = self.postings.get(term)
+                    if not postings:
+                        continue
+                    weight = 1.0 if term == token else 0.8
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, count in postings.items():
+                        norm = self.K1 * (1 - self.B + self.B * self.doc_lengths[doc_id] / average_length)
+                        scores[doc_id] += weight * idf * count * (self.K1 + 1) / (count + norm)
+
+        return scores.most_common(limit)
@@ -0,0 +1,286 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from journal import FileLock
+from response_cache import normalize_text
+
+# Words that carry no meaning for a workout request
+STOP_WORDS = frozenset((
+    "a", "am", "an", "and", "any", "at", "because", "but", "due", "for", "have", "has", "i", "im",
+    "in", "is", "it", "me", "my", "of", "on", "only", "or", "please", "some", "the", "to", "with",
+))
+
+# Words that flip the meaning of the next one: "no jumping" must not match "jumping"
+NEGATIONS = frozenset(("no", "not", "without", "avoid", "dont", "cant", "never", "non"))
+
+
+def text_features(text):
+    """Word and character trigram features of text, order-insensitive
+
+    Features of a word after a negation are marked, so they share nothing
+    with the plain word.
+    """
+    negated = False
+    for word in re.findall(r"[a-z0-9]+", normalize_text(text).replace("'", "")):
+        if word in NEGATIONS:
+            negated = True
+            continue
+        if word in STOP_WORDS:
+            continue
+        mark = "!" if negated else ""
+        negated = False
+        yield f"{mark}w:{word}"
+        padded = f"<{word}>"
+        for i in range(len(padded) - 2):
+            yield mark + padded[i:i + 3]
+
+
+def content_words(text):
+    """The word features of text, negated words marked, e.g. {"w:knee", "!w:jumping"}"""
+    return frozenset(feature for feature in text_features(text) if feature.startswith(("w:", "!w:")))
+
+
+def embed_text(text, dim=512):
+    """Unit-length hashed feature vector of text; no model or network needed
+
+    Features are hashed with a stable digest (Python's hash() differs
+    between processes) into dim buckets with a random sign.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in text_features(text):
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[h % dim] += -1.0 if h >> 63 else 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def encode_row(scope, key, vector, words):
+    """One index file line"""
+    return json.dumps({
+        "scope": scope,
+        "key": key,
+        "vector": base64.b64encode(vector.tobytes()).decode("ascii"),
+        "words": sorted(words)
+    }) + "\n"
+
+
+class SemanticCache:
+    """Nearest-neighbour index from request text to response cache keys
+
+    Requests are grouped by scope (the fields that must match exactly,
+    e.g. workout type and duration). Within a scope, free text is compared
+    by cosine similarity of embed_text vectors held in one NumPy matrix,
+    and a stored key is reused when its similarity reaches threshold and
+    the stored text has every content word of the new one: "bad knee" added
+    to otherwise identical notes asks for a different workout. Phrases in
+    ignore, e.g. a form's placeholder text, are removed before comparing.
+
+    Entries are appended to index_file as JSON lines with the vector
+    base64-encoded, so the index survives restarts. Every write holds an
+    advisory lock on ``{index_file}.lock``; past max_entries the least
+    recently used rows are evicted and the file is rewritten from its
+    current contents, keeping rows other processes appended.
+    """
+
+    def __init__(self, index_file, threshold=0.85, max_entries=5000, dim=512, ignore=()):
+        self.index_file = index_file
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.dim = dim
+        self.ignore = [normalize_text(phrase) for phrase in ignore]
+        self.lookups = 0
+        self.hits = 0
+        self.stale = 0
+        self.evictions = 0
+        self._scope_codes = {}
+        self._lock = threading.Lock()
+        self._file_lock = FileLock(index_file)
+        with self._file_lock.locked():
+            keys, scopes, vectors, words = self._read_file()
+        # Later rows were added more recently
+        self._set_rows(keys, scopes, vectors, np.arange(len(keys), dtype=np.float64), words)
+
+    def _read_file(self):
+        """Keys, scope codes, vectors and content words in the index file, skipping torn or foreign rows"""
+        keys, scopes, vectors, words = [], [], [], []
+        seen = set()
+        try:
+            with open(self.index_file, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        vector = np.frombuffer(base64.b64decode(entry["vector"]), dtype=np.float32)
+                        row_words = frozenset(entry["words"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    # Two processes may both have indexed the same request
+                    if len(vector) == self.dim and entry["key"] not in seen:
+                        seen.add(entry["key"])
+                        keys.append(entry["key"])
+                        scopes.append(self._scope_code(entry["scope"]))
+                        vectors.append(vector)
+                        words.append(row_words)
+        except FileNotFoundError:
+            pass
+        return (
+            keys,
+            np.array(scopes, dtype=np.int32),
+            np.array(vectors, dtype=np.float32).reshape(-1, self.dim),
+            words
+        )
+
+    def _scope_code(self, scope):
+        return self._scope_codes.setdefault(scope, len(self._scope_codes))
+
+    def _prepare(self, text):
+        """text without the ignored phrases"""
+        text = normalize_text(text)
+        for phrase in self.ignore:
+            text = text.replace(phrase, " ")
+        return text
+
+    def _set_rows(self, keys, scopes, vectors, last_used, words):
+        """Replace all rows, leaving room to append"""
+        size = len(keys)
+        capacity = max(16, size * 2)
+        self._keys = keys
+        self._words = words
+        self._key_rows = {key: row for row, key in enumerate(keys)}
+        self._scopes = np.full(capacity, -1, dtype=np.int32)
+        self._scopes[:size] = scopes
+        self._vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        self._vectors[:size] = vectors
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._last_used[:size] = last_used
+
+    def search(self, scope, text, k=1):
+        """Up to k (key, similarity) pairs in scope that match text, best first"""
+        text = self._prepare(text)
+        query, words = embed_text(text, self.dim), content_words(text)
+        with self._lock:
+            return [(self._keys[row], score) for row, score in self._search(scope, query, words, k)]
+
+    def _search(self, scope, query, words, k):
+        """(row, similarity) pairs for search: one matrix-vector product, then the word check on rows over the threshold"""
+        size = len(self._keys)
+        code = self._scope_codes.get(scope)
+        if not size or code is None:
+            return []
+        scores = np.where(self._scopes[:size] == code, self._vectors[:size] @ query, -np.inf)
+        above = np.flatnonzero(scores >= self.threshold)
+        matches = []
+        for row in above[np.argsort(-scores[above], kind="stable")]:
+            if words <= self._words[row]:
+                matches.append((int(row), float(scores[row])))
+                if len(matches) == k:
+                    break
+        return matches
+
+    def lookup(self, scope, text, get):
+        """Value of the most similar stored request, or None
+
+        get(key) fetches the value, e.g. ResponseCache.get; rows whose value
+        is gone (expired or evicted) are dropped and the next best is tried.
+        """
+        text = self._prepare(text)
+        query, words = embed_text(text, self.dim), content_words(text)
+        with self._lock:
+            self.lookups += 1
+            candidates = [self._keys[row] for row, _ in self._search(scope, query, words, k=3)]
+        for key in candidates:
+            value = get(key)
+            with self._lock:
+                # Rows may have moved if another thread evicted meanwhile
+                row = self._key_rows.get(key)
+                if value is None:
+                    if row is not None:
+                        self._scopes[row] = -1
+                        self._last_used[row] = -np.inf
+                        self.stale += 1
+                    continue
+                self.hits += 1
+                if row is not None:
+                    self._last_used[row] = time.time()
+            return value
+        return None
+
+    def add(self, scope, text, key):
+        """Index text under scope, pointing at key"""
+        text = self._prepare(text)
+        vector, words = embed_text(text, self.dim), content_words(text)
+        with self._lock:
+            row = self._key_rows.get(key)
+            if row is not None:
+                # The same request again (e.g. a regenerated workout); lookup may have marked it stale
+                self._scopes[row] = self._scope_code(scope)
+                self._vectors[row] = vector
+                self._words[row] = words
+                self._last_used[row] = time.time()
+                return
+            self._append(key, self._scope_code(scope), vector, words, time.time())
+            with self._file_lock.locked():
+                with open(self.index_file, "a") as f:
+                    f.write(encode_row(scope, key, vector, words))
+                if len(self._keys) > self.max_entries:
+                    self._evict()
+
+    def _append(self, key, code, vector, words, last_used):
+        """Add one row in memory, growing the arrays when full"""
+        size = len(self._keys)
+        if size == len(self._vectors):
+            self._set_rows(self._keys, self._scopes[:size], self._vectors[:size], self._last_used[:size], self._words)
+        self._keys.append(key)
+        self._words.append(words)
+        self._key_rows[key] = size
+        self._scopes[size] = code
+        self._vectors[size] = vector
+        self._last_used[size] = last_used
+
+    def _evict(self):
+        """Drop the least recently used rows down to 90% of max_entries and rewrite the file
+
+        Call with both locks held. Rows other processes appended since this
+        one loaded are merged in first, as just used, so the rewrite keeps them.
+        """
+        file_keys, file_scopes, file_vectors, file_words = self._read_file()
+        now = time.time()
+        for key, code, vector, words in zip(file_keys, file_scopes, file_vectors, file_words):
+            if key not in self._key_rows:
+                self._append(key, code, vector, words, now)
+
+        size = len(self._keys)
+        keep = np.sort(np.argsort(self._last_used[:size], kind="stable")[max(0, size - self.max_entries * 9 // 10):])
+        keep = keep[self._scopes[keep] >= 0]
+        self.evictions += size - len(keep)
+        keys = [self._keys[row] for row in keep]
+        words = [self._words[row] for row in keep]
+        scopes = self._scopes[keep]
+        vectors = self._vectors[keep]
+        last_used = self._last_used[keep]
+
+        names = {code: scope for scope, code in self._scope_codes.items()}
+        tmp_path = f"{self.index_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            for key, code, vector, row_words in zip(keys, scopes, vectors, words):
+                f.write(encode_row(names[code], key, vector, row_words))
+        os.replace(tmp_path, self.index_file)
+        self._set_rows(keys, scopes, vectors, last_used, words)
+
+    def stats(self):
+        """Lookup counters for monitoring"""
+        with self._lock:
+            return {
+                "entries": len(self._keys),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "stale": self.stale,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,114 @@
+import threading
+import time
+
+
+class SingleFlightTimeout(Exception):
+    """Raised when a waiter gave up before the shared call finished"""
+
+
+class Flight:
+    """One upstream call and the chunks it has produced so far"""
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """Share one upstream streaming call between concurrent identical requests
+
+    The first request for a key starts a flight: a background thread pumps
+    its chunks into a buffer. Requests for the same key that arrive while it
+    runs join it and replay the buffer from the start, then follow along as
+    new chunks arrive. The flight finishes even if every waiter leaves, so
+    its on_complete callback (e.g. a cache write) still runs.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.flights = 0
+        self.joined = 0
+        self.timeouts = 0
+
+    def stream(self, key, chunks, timeout=None, on_complete=None):
+        """Yield the chunks of the call for key, starting it from chunks if none is in flight
+
+        chunks is only consumed when this request starts the flight.
+        on_complete(text) runs once after a successful call, before later
+        requests for key would start a new one. timeout is how many seconds
+        this waiter waits for the whole response.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                self.flights += 1
+                starter = True
+            else:
+                self.joined += 1
+                starter = False
+
+        if starter:
+            threading.Thread(
+                target=self._pump, args=(key, flight, chunks, on_complete),
+                name="single-flight", daemon=True
+            ).start()
+        return self._follow(flight, timeout)
+
+    def _pump(self, key, flight, chunks, on_complete):
+        try:
+            for chunk in chunks:
+                with flight.cond:
+                    flight.chunks.append(chunk)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.error = e
+        else:
+            if on_complete is not None:
+                try:
+                    on_complete("".join(flight.chunks))
+                except Exception:
+                    # The waiters already have the full response
+                    pass
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    def _follow(self, flight, timeout):
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        position = 0
+        while True:
+            with flight.cond:
+                while position == len(flight.chunks) and not flight.done:
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        with self._lock:
+                            self.timeouts += 1
+                        raise SingleFlightTimeout(f"Gave up after {timeout:.0f}s waiting for the response")
+                    flight.cond.wait(remaining)
+                new_chunks = flight.chunks[position:]
+                position += len(new_chunks)
+                finished = flight.done and position == len(flight.chunks)
+
+            yield from new_chunks
+            if finished:
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+    def stats(self):
+        """Deduplication counters for monitoring; joined is upstream calls saved"""
+        with self._lock:
+            return {
+                "flights": self.flights,
+                "joined": self.joined,
+                "in_flight": len(self._flights),
+                "timeouts": self.timeouts,
+            }
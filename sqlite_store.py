@@ -0,0 +1,260 @@
+import json
+import sqlite3
+import sys
+import threading
+
+from storage import StorageBackend, chat_record, new_chat_records
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS workouts (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    workout_type TEXT NOT NULL,
+    duration INTEGER,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_workouts_user_time ON workouts (username, timestamp);
+CREATE INDEX IF NOT EXISTS idx_workouts_user_type ON workouts (username, workout_type, timestamp);
+
+CREATE TABLE IF NOT EXISTS workout_muscle_groups (
+    workout_id TEXT NOT NULL,
+    muscle_group TEXT NOT NULL,
+    PRIMARY KEY (workout_id, muscle_group)
+);
+CREATE INDEX IF NOT EXISTS idx_muscle_groups ON workout_muscle_groups (muscle_group, workout_id);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user ON chat_messages (username, id);
+"""
+
+# Hot queries are kept as constants so sqlite3's per-connection statement
+# cache reuses the prepared statement on every call
+SQL_AUTHENTICATE = "SELECT 1 FROM users WHERE username = ? AND password = ?"
+SQL_COUNT_WORKOUTS = "SELECT COUNT(*) FROM workouts WHERE username = ?"
+# Listings leave the workout text out; get_workout and iter_workouts read it
+SQL_METADATA = "json_remove(data, '$.content')"
+SQL_LAST_WORKOUT = (
+    f"SELECT id, timestamp, {SQL_METADATA} FROM workouts WHERE username = ? "
+    "ORDER BY timestamp DESC, rowid DESC LIMIT 1"
+)
+SQL_ITER_WORKOUTS = (
+    "SELECT id, timestamp, data FROM workouts WHERE username = ? "
+    "ORDER BY timestamp DESC, rowid DESC"
+)
+SQL_GET_WORKOUT = "SELECT id, timestamp, data FROM workouts WHERE username = ? AND id = ?"
+SQL_QUERY_FILTERS = {
+    "workout_type": "workout_type = ?",
+    "muscle_group": (
+        "EXISTS (SELECT 1 FROM workout_muscle_groups m "
+        "WHERE m.workout_id = workouts.id AND m.muscle_group = ?)"
+    ),
+    "start": "timestamp >= ?",
+    "end": "timestamp <= ?",
+}
+SQL_INSERT_USER = "INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)"
+SQL_INSERT_WORKOUT = (
+    "INSERT OR IGNORE INTO workouts (id, username, timestamp, workout_type, duration, data) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+SQL_INSERT_MUSCLE_GROUP = (
+    "INSERT OR IGNORE INTO workout_muscle_groups (workout_id, muscle_group) VALUES (?, ?)"
+)
+SQL_CHAT_HISTORY = "SELECT content FROM chat_messages WHERE username = ? ORDER BY id"
+SQL_COUNT_CHAT_MESSAGES = "SELECT COUNT(*) FROM chat_messages WHERE username = ?"
+SQL_CHAT_MESSAGES = (
+    "SELECT content, created_at FROM chat_messages WHERE username = ? "
+    "ORDER BY id LIMIT ? OFFSET ?"
+)
+SQL_INSERT_CHAT_MESSAGE = (
+    "INSERT INTO chat_messages (username, content, created_at) VALUES (?, ?, ?)"
+)
+SQL_CLEAR_CHAT = "DELETE FROM chat_messages WHERE username = ?"
+
+
+def row_to_entry(row):
+    """Turn an (id, timestamp, data) row back into a workout entry"""
+    return {"id": row[0], "timestamp": row[1], "data": json.loads(row[2])}
+
+
+class SqliteStore(StorageBackend):
+    """SQLite storage backend running in WAL mode with one connection per thread"""
+
+    def __init__(self, db_file, default_users):
+        self.db_file = db_file
+        self._local = threading.local()
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            for username, user in default_users.items():
+                conn.execute(SQL_INSERT_USER, (username, user["password"]))
+
+    def _connection(self):
+        """Return this thread's connection, opening it on first use"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def authenticate(self, username, password):
+        row = self._connection().execute(SQL_AUTHENTICATE, (username, password)).fetchone()
+        return row is not None
+
+    def count_workouts(self, username):
+        return self._connection().execute(SQL_COUNT_WORKOUTS, (username,)).fetchone()[0]
+
+    def last_workout(self, username):
+        row = self._connection().execute(SQL_LAST_WORKOUT, (username,)).fetchone()
+        return row_to_entry(row) if row else None
+
+    def iter_workouts(self, username):
+        # A cursor of its own, so rows are decoded one at a time
+        for row in self._connection().execute(SQL_ITER_WORKOUTS, (username,)):
+            yield row_to_entry(row)
+
+    def get_workout(self, username, workout_id):
+        row = self._connection().execute(SQL_GET_WORKOUT, (username, workout_id)).fetchone()
+        return row_to_entry(row) if row else None
+
+    def query_workouts(self, username, workout_type=None, muscle_group=None,
+                       start=None, end=None, offset=0, limit=20):
+        values = {
+            "workout_type": workout_type,
+            "muscle_group": muscle_group,
+            "start": start,
+            "end": f"{end} 99" if end else None,
+        }
+        clauses = ["username = ?"]
+        params = [username]
+        for name, value in values.items():
+            if value:
+                clauses.append(SQL_QUERY_FILTERS[name])
+                params.append(value)
+        where = " AND ".join(clauses)
+
+        conn = self._connection()
+        total = conn.execute(f"SELECT COUNT(*) FROM workouts WHERE {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT id, timestamp, {SQL_METADATA} FROM workouts WHERE {where} "
+            "ORDER BY timestamp DESC, rowid DESC LIMIT ? OFFSET ?",
+            params + [limit, offset]
+        ).fetchall()
+        return [row_to_entry(row) for row in rows], total
+
+    def add_workout(self, username, entry):
+        with self._connection() as conn:
+            insert_workout(conn, username, entry)
+
+    def save_users(self):
+        # Every write is committed as it happens
+        pass
+
+    def get_chat_history(self, username):
+        rows = self._connection().execute(SQL_CHAT_HISTORY, (username,)).fetchall()
+        return [row[0] for row in rows]
+
+    def count_chat_messages(self, username):
+        return self._connection().execute(SQL_COUNT_CHAT_MESSAGES, (username,)).fetchone()[0]
+
+    def get_chat_messages(self, username, start=0, end=None):
+        # Message indexes are row positions within the user's history
+        limit = -1 if end is None else max(0, end - start)
+        rows = self._connection().execute(
+            SQL_CHAT_MESSAGES, (username, limit, start)
+        ).fetchall()
+        return [chat_record(start + i, row[0], row[1]) for i, row in enumerate(rows)]
+
+    def append_chat_messages(self, username, messages):
+        with self._connection() as conn:
+            # Take the write lock before counting so concurrent appends get distinct indexes
+            conn.execute("BEGIN IMMEDIATE")
+            start = conn.execute(SQL_COUNT_CHAT_MESSAGES, (username,)).fetchone()[0]
+            records = new_chat_records(start, messages)
+            conn.executemany(
+                SQL_INSERT_CHAT_MESSAGE,
+                [(username, record["text"], record["ts"]) for record in records]
+            )
+        return records
+
+    def clear_chat_history(self, username):
+        with self._connection() as conn:
+            conn.execute(SQL_CLEAR_CHAT, (username,))
+
+    def save_chats(self):
+        # Every write is committed as it happens
+        pass
+
+
+def insert_workout(conn, username, entry):
+    """Insert one workout entry and its muscle group rows"""
+    data = entry["data"]
+    conn.execute(
+        SQL_INSERT_WORKOUT,
+        (
+            entry["id"],
+            username,
+            entry["timestamp"],
+            data["workout_type"],
+            data.get("duration"),
+            json.dumps(data)
+        )
+    )
+    conn.executemany(
+        SQL_INSERT_MUSCLE_GROUP,
+        [(entry["id"], muscle_group) for muscle_group in data.get("muscle_group", [])]
+    )
+
+
+def migrate_json_to_sqlite(store, source):
+    """Copy users, workouts and chat histories from a JSON DataStore into store
+
+    Workouts are inserted with INSERT OR IGNORE, so running the migration
+    twice does not duplicate them. Chat histories are only imported for users
+    that have no messages in the database yet.
+    """
+    with store._connection() as conn:
+        for username in source.usernames():
+            conn.execute(SQL_INSERT_USER, (username, source.get_user(username)["password"]))
+            for entry in source.iter_workouts(username):
+                insert_workout(conn, username, entry)
+
+        for username in source.chat_usernames():
+            history = source.get_chat_messages(username)
+            if not history:
+                continue
+            if conn.execute(SQL_CHAT_HISTORY, (username,)).fetchone() is not None:
+                continue
+            conn.executemany(
+                SQL_INSERT_CHAT_MESSAGE,
+                [(username, record["text"], record["ts"]) for record in history]
+            )
+
+
+if __name__ == "__main__":
+    from data_store import DataStore
+
+    if len(sys.argv) != 7:
+        print(
+            "Usage: python sqlite_store.py USERS_FILE CHATS_FILE JOURNAL_FILE "
+            "USERS_DIR CHATS_DIR DB_FILE"
+        )
+        sys.exit(1)
+    users_file, chats_file, journal_file, users_dir, chats_dir, db_file = sys.argv[1:]
+    source = DataStore(
+        users_file, chats_file, journal_file, {}, chats_dir=chats_dir, users_dir=users_dir
+    )
+    migrate_json_to_sqlite(SqliteStore(db_file, {}), source)
+    print(f"Migrated {users_dir} and {chats_dir} into {db_file}")
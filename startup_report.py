@@ -0,0 +1,73 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Dependencies that should not be imported before the login page renders
+HEAVY_MODULES = ("google.generativeai", "fpdf", "numpy")
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_imports(statement):
+    """Run statement under ``python -X importtime``
+
+    Returns the wall time in seconds and (module, self_us, cumulative_us,
+    depth) rows in import order.
+    """
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True
+    )
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"{statement!r} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match:
+            depth = len(match.group(3)) // 2
+            rows.append((match.group(4), int(match.group(1)), int(match.group(2)), depth))
+    return wall, rows
+
+
+def report(module="app", top=15):
+    """Print how long importing module takes beyond Streamlit itself, and what it pulls in"""
+    # The Streamlit server has imported streamlit before it runs the app script
+    base_wall, base_rows = measure_imports("import streamlit")
+    wall, rows = measure_imports(
+        f"import sys; sys.path.insert(0, {APP_DIR!r}); import streamlit; import {module}"
+    )
+    baseline = {name for name, _, _, _ in base_rows}
+    added = [row for row in rows if row[0] not in baseline]
+    # Modules imported directly by the app sit one level below it
+    direct = [row for row in added if row[3] == 1]
+
+    print(f"python + streamlit import: {base_wall * 1000:.0f} ms")
+    print(f"python + streamlit + {module}: {wall * 1000:.0f} ms")
+    print(f"{module} startup on top of streamlit: {(wall - base_wall) * 1000:.0f} ms "
+          f"({len(added)} modules)")
+    print()
+    print(f"Slowest imports of {module} (cumulative):")
+    for name, _, cumulative, _ in sorted(direct, key=lambda row: -row[2])[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    loaded = [name for name in HEAVY_MODULES if any(row[0] == name for row in added)]
+    print()
+    if loaded:
+        print(f"Heavy modules imported at startup: {', '.join(loaded)}")
+    else:
+        print("Heavy modules imported at startup: none")
+    return not loaded
+
+
+if __name__ == "__main__":
+    # Importing the app opens its data files in the current directory
+    module = sys.argv[1] if len(sys.argv) > 1 else "app"
+    sys.exit(0 if report(module) else 1)
@@ -0,0 +1,139 @@
+import datetime
+import os
+from abc import ABC, abstractmethod
+
+
+class StorageBackend(ABC):
+    """Interface shared by the JSON-file and SQLite storage backends
+
+    Workout entries are dicts of the form ``{"id", "timestamp", "data"}``, the
+    same shape the JSON files have always used. Listing methods may leave the
+    workout text (``data["content"]``) out; get_workout and iter_workouts
+    always include it. Chat histories alternate
+    user and coach messages; each one is stored as a chat record (see
+    chat_record).
+    """
+
+    def refresh(self):
+        """Pick up changes made by other processes; returns self"""
+        return self
+
+    @abstractmethod
+    def authenticate(self, username, password):
+        """Return True if the username exists and the password matches"""
+
+    @abstractmethod
+    def count_workouts(self, username):
+        """Number of workouts saved by one user"""
+
+    @abstractmethod
+    def last_workout(self, username):
+        """Most recently saved workout entry, or None; may omit the content"""
+
+    @abstractmethod
+    def iter_workouts(self, username):
+        """All workout entries for one user with their content, newest first"""
+
+    @abstractmethod
+    def get_workout(self, username, workout_id):
+        """One workout entry by id with its content, or None"""
+
+    @abstractmethod
+    def query_workouts(self, username, workout_type=None, muscle_group=None,
+                       start=None, end=None, offset=0, limit=20):
+        """One page of matching workout entries, newest first, plus the total match count
+
+        Entries may omit the content. start and end are inclusive ``YYYY-MM-DD`` dates; None means unbounded.
+        """
+
+    @abstractmethod
+    def add_workout(self, username, entry):
+        """Persist one new workout entry"""
+
+    @abstractmethod
+    def save_users(self):
+        """Flush all user data to durable storage"""
+
+    @abstractmethod
+    def get_chat_history(self, username):
+        """Chat message texts for one user, oldest first"""
+
+    @abstractmethod
+    def count_chat_messages(self, username):
+        """Number of messages in one user's chat history"""
+
+    @abstractmethod
+    def get_chat_messages(self, username, start=0, end=None):
+        """Chat records with index in [start, end), oldest first"""
+
+    @abstractmethod
+    def append_chat_messages(self, username, messages):
+        """Add message texts to the end of one user's chat history; returns the new records"""
+
+    @abstractmethod
+    def clear_chat_history(self, username):
+        """Delete one user's chat history"""
+
+    @abstractmethod
+    def save_chats(self):
+        """Flush all chat histories to durable storage"""
+
+
+def chat_record(index, text, ts=None):
+    """Chat message record; even indexes are the user's, odd ones the coach's
+
+    turn numbers each question/answer pair, so index 4 and 5 are turn 2.
+    """
+    return {
+        "index": index,
+        "turn": index // 2,
+        "role": "user" if index % 2 == 0 else "coach",
+        "ts": ts,
+        "text": text,
+    }
+
+
+def new_chat_records(start, messages):
+    """Records for messages appended at index start, stamped with the current time"""
+    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [chat_record(start + i, text, ts) for i, text in enumerate(messages)]
+
+
+def open_json_storage(default_users, options):
+    """Create the JSON-file backend from open_storage options"""
+    from data_store import DataStore
+
+    return DataStore(
+        options["users_file"],
+        options["chats_file"],
+        options["journal_file"],
+        default_users,
+        compact_every=options.get("compact_every", 200),
+        chats_dir=options["chats_dir"],
+        flush_latency=options.get("flush_latency"),
+        users_dir=options["users_dir"]
+    )
+
+
+def open_storage(backend, default_users, **options):
+    """Create the storage backend named by backend ("json" or "sqlite")
+
+    flush_latency (seconds) turns on group-committed journal writes for the
+    JSON backend; None writes every save synchronously.
+    """
+    if backend == "sqlite":
+        from sqlite_store import SqliteStore, migrate_json_to_sqlite
+
+        db_file = options["db_file"]
+        is_new = not os.path.exists(db_file)
+        store = SqliteStore(db_file, default_users)
+        has_json_data = os.path.isdir(options["users_dir"]) or os.path.exists(options["users_file"])
+        if is_new and has_json_data:
+            # One-shot import of the existing JSON data into a fresh database
+            migrate_json_to_sqlite(store, open_json_storage({}, options))
+        return store
+
+    if backend == "json":
+        return open_json_storage(default_users, options)
+
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from semantic_cache import SemanticCache
+
+# The prefilled additional notes in app.py
+NOTES_PLACEHOLDER = "Include any injuries, equipment available, fitness level, or goals."
+GOALS = "Intermediate lifter, dumbbells and a bench at home, goal fat loss"
+
+
+def make_cache(tmp_path, **kwargs):
+    return SemanticCache(str(tmp_path / "index.jsonl"), ignore=(NOTES_PLACEHOLDER,), **kwargs)
+
+
+# Before the placeholder was ignored and new content words were required, these
+# scored 0.934, 0.884 and 0.886 against the cached notes and got the wrong workout
+@pytest.mark.parametrize("cached, notes", [
+    (NOTES_PLACEHOLDER, f"{NOTES_PLACEHOLDER} Bad knee"),
+    (NOTES_PLACEHOLDER, f"{NOTES_PLACEHOLDER} I have a bad knee, no jumping"),
+    (GOALS, f"{GOALS}, shoulder injury"),
+])
+def test_new_content_words_are_not_matched(tmp_path, cached, notes):
+    cache = make_cache(tmp_path)
+    cache.add("scope", cached, "cached")
+    assert cache.lookup("scope", notes, lambda key: key) is None
+
+
+def test_rephrased_notes_are_matched(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.add("scope", GOALS, "cached")
+    notes = "At home with a bench and dumbbells; intermediate lifter. Goal: fat loss"
+    assert cache.lookup("scope", notes, lambda key: key) == "cached"
+
+
+def test_add_revives_a_stale_row(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.add("scope", GOALS, "cached")
+    assert cache.lookup("scope", GOALS, lambda key: None) is None
+    cache.add("scope", GOALS, "cached")
+    assert cache.lookup("scope", GOALS, lambda key: key) == "cached"
+
+
+def test_eviction_keeps_rows_other_processes_appended(tmp_path):
+    first = make_cache(tmp_path, max_entries=10)
+    second = make_cache(tmp_path, max_entries=10)
+    for i in range(8):
+        first.add("scope", f"kettlebell {i}", f"first-{i}")
+    second.add("scope", "resistance bands", "second")
+    for i in range(8, 11):
+        first.add("scope", f"kettlebell {i}", f"first-{i}")
+
+    with open(tmp_path / "index.jsonl") as f:
+        keys = {json.loads(line)["key"] for line in f}
+    assert first.evictions > 0
+    assert "second" in keys
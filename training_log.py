@@ -0,0 +1,245 @@
+import datetime
+import os
+import re
+import threading
+from collections import namedtuple
+from urllib.parse import quote
+
+import numpy as np
+
+Exercise = namedtuple("Exercise", ["name", "sets", "reps", "duration", "rest"])
+
+# One append-only binary file per column and user
+COLUMNS = {
+    "timestamp": np.int64,
+    "sets": np.int16,
+    "reps": np.float32,
+    "duration": np.float32,
+    "rest": np.float32,
+    "muscle_mask": np.uint16,
+}
+
+FIELD_LINE = re.compile(r"^(exercise name|exercise|sets|reps|duration|rest)\s*:\s*(.+)$", re.IGNORECASE)
+NUMBER_RANGE = re.compile(r"(\d+(?:\.\d+)?)(?:\s*(?:-|–|to)\s*(\d+(?:\.\d+)?))?")
+SECONDS_PER_WEEK = 7 * 24 * 3600
+
+
+def parse_number(text):
+    """First number in text; ranges like 8-12 become their midpoint"""
+    match = NUMBER_RANGE.search(text)
+    if not match:
+        return None
+    low = float(match.group(1))
+    high = float(match.group(2)) if match.group(2) else low
+    return (low + high) / 2
+
+
+def parse_seconds(text):
+    """Duration text such as "30 seconds", "1-2 min" or "90s" in seconds"""
+    value = parse_number(text)
+    if value is None:
+        return None
+    if re.search(r"\bmin", text, re.IGNORECASE):
+        return value * 60
+    return value
+
+
+def parse_exercises(content):
+    """Extract exercises from the "Exercise Name / Sets / Reps / Rest" lines of a workout"""
+    exercises = []
+    current = None
+    for line in content.split("\n"):
+        # Drop bullets and bold markers, e.g. "- **Sets:** 3"
+        line = line.strip().lstrip("-*•0123456789. ").replace("**", "").strip()
+        match = FIELD_LINE.match(line)
+        if not match:
+            continue
+        field = match.group(1).lower()
+        value = match.group(2).strip()
+
+        if field in ("exercise name", "exercise"):
+            if current is not None:
+                exercises.append(Exercise(**current))
+            current = {"name": value, "sets": 0, "reps": np.nan, "duration": np.nan, "rest": np.nan}
+        elif current is None:
+            continue
+        elif field == "sets":
+            current["sets"] = int(parse_number(value) or 0)
+        elif field == "reps":
+            # "Reps: 30 seconds" is really a timed set
+            if re.search(r"\b(sec|min)", value, re.IGNORECASE):
+                current["duration"] = parse_seconds(value) or np.nan
+            else:
+                current["reps"] = parse_number(value) or np.nan
+        elif field == "duration":
+            current["duration"] = parse_seconds(value) or np.nan
+        elif field == "rest":
+            current["rest"] = parse_seconds(value) or np.nan
+
+    if current is not None:
+        exercises.append(Exercise(**current))
+    return exercises
+
+
+def timestamp_seconds(timestamp):
+    """Seconds since the epoch for a saved workout's timestamp string"""
+    return int(datetime.datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp())
+
+
+class UserColumns:
+    """In-memory NumPy columns for one user with amortized O(1) appends"""
+
+    def __init__(self, arrays):
+        self.size = len(arrays["timestamp"])
+        capacity = max(16, self.size)
+        self.arrays = {}
+        for name, dtype in COLUMNS.items():
+            column = np.zeros(capacity, dtype=dtype)
+            column[:self.size] = arrays[name]
+            self.arrays[name] = column
+
+    def append(self, rows):
+        count = len(rows["timestamp"])
+        needed = self.size + count
+        capacity = len(self.arrays["timestamp"])
+        if needed > capacity:
+            capacity = max(needed, capacity * 2)
+            for name in COLUMNS:
+                grown = np.zeros(capacity, dtype=COLUMNS[name])
+                grown[:self.size] = self.arrays[name][:self.size]
+                self.arrays[name] = grown
+        for name in COLUMNS:
+            self.arrays[name][self.size:needed] = rows[name]
+        self.size = needed
+
+    def view(self):
+        """Read-only views of the filled part of every column"""
+        views = {}
+        for name in COLUMNS:
+            column = self.arrays[name][:self.size]
+            column.flags.writeable = False
+            views[name] = column
+        return views
+
+
+class TrainingLog:
+    """Columnar store of extracted exercises, one set of column files per user"""
+
+    def __init__(self, log_dir, muscle_groups):
+        self.log_dir = log_dir
+        self.muscle_groups = list(muscle_groups)
+        self._codes = {group: i for i, group in enumerate(self.muscle_groups)}
+        self._users = {}
+        self._lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+
+    def _user_dir(self, username):
+        return os.path.join(self.log_dir, quote(username, safe=""))
+
+    def has_user(self, username):
+        """True once the user's log exists, even if no exercises were found"""
+        return os.path.isdir(self._user_dir(username))
+
+    def _columns(self, username):
+        """Load a user's columns from disk on first use; call with the lock held"""
+        columns = self._users.get(username)
+        if columns is None:
+            user_dir = self._user_dir(username)
+            paths = {name: os.path.join(user_dir, f"{name}.bin") for name in COLUMNS}
+            rows = {
+                name: os.path.getsize(path) // np.dtype(COLUMNS[name]).itemsize if os.path.exists(path) else 0
+                for name, path in paths.items()
+            }
+            # A crash between column appends leaves some files longer, maybe with a torn
+            # value; cut them back so the next append lines up across columns again
+            size = min(rows.values())
+            for name, path in paths.items():
+                if os.path.exists(path) and os.path.getsize(path) > size * np.dtype(COLUMNS[name]).itemsize:
+                    os.truncate(path, size * np.dtype(COLUMNS[name]).itemsize)
+            columns = UserColumns({
+                name: np.fromfile(path, dtype=COLUMNS[name], count=size) if size else np.zeros(0, dtype=COLUMNS[name])
+                for name, path in paths.items()
+            })
+            self._users[username] = columns
+        return columns
+
+    def muscle_mask(self, muscle_groups):
+        """Bitmask of the known muscle groups a workout targets"""
+        mask = 0
+        for group in muscle_groups:
+            code = self._codes.get(group)
+            if code is not None:
+                mask |= 1 << code
+        return mask
+
+    def rows_for_workout(self, timestamp, workout_data):
+        """Column arrays for the exercises parsed from one workout"""
+        exercises = parse_exercises(workout_data["content"])
+        count = len(exercises)
+        return {
+            "timestamp": np.full(count, timestamp_seconds(timestamp), dtype=COLUMNS["timestamp"]),
+            "sets": np.array([e.sets for e in exercises], dtype=COLUMNS["sets"]),
+            "reps": np.array([e.reps for e in exercises], dtype=COLUMNS["reps"]),
+            "duration": np.array([e.duration for e in exercises], dtype=COLUMNS["duration"]),
+            "rest": np.array([e.rest for e in exercises], dtype=COLUMNS["rest"]),
+            "muscle_mask": np.full(
+                count, self.muscle_mask(workout_data.get("muscle_group", [])), dtype=COLUMNS["muscle_mask"]
+            ),
+        }
+
+    def _write(self, username, rows):
+        # Loaded first, so the files are trimmed to whole rows before this append
+        columns = self._columns(username)
+        user_dir = self._user_dir(username)
+        os.makedirs(user_dir, exist_ok=True)
+        for name in COLUMNS:
+            with open(os.path.join(user_dir, f"{name}.bin"), "ab") as f:
+                rows[name].tofile(f)
+        columns.append(rows)
+
+    def add_workout(self, username, timestamp, workout_data):
+        """Parse one saved workout and append its exercises to the user's columns"""
+        rows = self.rows_for_workout(timestamp, workout_data)
+        with self._lock:
+            self._write(username, rows)
+
+    def rebuild(self, username, workouts):
+        """Backfill a user's log from workouts saved before the log existed"""
+        with self._lock:
+            if self.has_user(username):
+                return
+            rows = [self.rows_for_workout(w["timestamp"], w["data"]) for w in workouts]
+            merged = {
+                name: np.concatenate([r[name] for r in rows]) if rows else np.zeros(0, dtype=dtype)
+                for name, dtype in COLUMNS.items()
+            }
+            self._write(username, merged)
+
+    def summary(self, username, weeks=8, now=None):
+        """Weekly volume, muscle-group balance and volume trend, all vectorized"""
+        with self._lock:
+            columns = self._columns(username).view()
+
+        now = int(now if now is not None else datetime.datetime.now().timestamp())
+        # Week 0 is the oldest of the reported weeks, week weeks-1 the current one
+        week = weeks - 1 - (now - columns["timestamp"]) // SECONDS_PER_WEEK
+        in_range = (week >= 0) & (week < weeks)
+
+        volume = columns["sets"].astype(np.float64) * np.nan_to_num(columns["reps"])
+        weekly_volume = np.bincount(week[in_range], weights=volume[in_range], minlength=weeks)
+        weekly_sets = np.bincount(week[in_range], weights=columns["sets"][in_range], minlength=weeks)
+
+        bits = (columns["muscle_mask"][:, None] >> np.arange(len(self.muscle_groups))) & 1
+        balance = (bits * columns["sets"][:, None]).sum(axis=0)
+
+        trend = 0.0
+        if np.count_nonzero(weekly_volume) >= 2:
+            trend = float(np.polyfit(np.arange(weeks), weekly_volume, 1)[0])
+
+        return {
+            "exercises": len(columns["timestamp"]),
+            "weekly_volume": weekly_volume,
+            "weekly_sets": weekly_sets,
+            "muscle_group_sets": dict(zip(self.muscle_groups, balance.tolist())),
+            "volume_trend_per_week": trend,
+        }
@@ -0,0 +1,151 @@
+import datetime
+from functools import lru_cache
+
+# Block kinds in a parsed workout document
+HEADING_1 = 1
+HEADING_2 = 2
+HEADING_3 = 3
+BOLD = 4
+BULLET = 5
+TEXT = 6
+BLANK = 7
+
+# PDF font style and size for each block kind
+PDF_FONTS = {
+    HEADING_1: ("B", 14),
+    HEADING_2: ("B", 12),
+    HEADING_3: ("B", 11),
+    BOLD: ("B", 10),
+    BULLET: ("", 10),
+    TEXT: ("", 10),
+}
+
+
+def parse_line(line):
+    """Classify one markdown line as a (kind, text) block"""
+    # Handle headers
+    if line.startswith('# '):
+        return (HEADING_1, line[2:])
+    if line.startswith('## '):
+        return (HEADING_2, line[3:])
+    if line.startswith('### '):
+        return (HEADING_3, line[4:])
+    # Handle bold text
+    if line.startswith('**') and line.endswith('**'):
+        return (BOLD, line.strip('*'))
+    # Handle list items
+    if line.startswith('- ') or line.startswith('* '):
+        return (BULLET, line[2:])
+    # Handle normal text
+    if line.strip():
+        return (TEXT, line)
+    return (BLANK, "")
+
+
+@lru_cache(maxsize=512)
+def parse_workout_markdown(content):
+    """Parse workout markdown once into a tuple of (kind, text) blocks
+
+    The result is immutable and cached by content, so every exporter and
+    every repeat export of the same workout shares one parse.
+    """
+    return tuple(parse_line(line) for line in content.split('\n'))
+
+
+class PdfWriter:
+    """Thin FPDF wrapper that skips redundant set_font calls"""
+
+    def __init__(self):
+        # Imported on first use to keep fpdf out of the app's startup
+        from fpdf import FPDF
+
+        self.pdf = FPDF()
+        self.pdf.add_page()
+        self.font = None
+
+    def set_font(self, style, size):
+        if self.font != (style, size):
+            self.pdf.set_font("Arial", style, size)
+            self.font = (style, size)
+
+
+def create_workout_pdf(workout_data):
+    """Create a PDF with the workout details"""
+    writer = PdfWriter()
+    pdf = writer.pdf
+
+    # Set up the PDF
+    writer.set_font("B", 16)
+    pdf.cell(0, 10, "Personalized Workout Plan", ln=True, align="C")
+    pdf.line(10, 22, 200, 22)
+    pdf.ln(5)
+
+    # Add metadata
+    writer.set_font("B", 12)
+    pdf.cell(0, 10, f"Type: {workout_data['workout_type']}", ln=True)
+    pdf.cell(0, 10, f"Muscle Groups: {', '.join(workout_data['muscle_group'])}", ln=True)
+    pdf.cell(0, 10, f"Duration: {workout_data['duration']} minutes", ln=True)
+    pdf.ln(5)
+
+    # Additional notes
+    writer.set_font("B", 12)
+    pdf.cell(0, 10, "Additional Notes:", ln=True)
+    writer.set_font("", 10)
+    pdf.multi_cell(0, 10, workout_data['notes'])
+    pdf.ln(5)
+
+    # Main workout content
+    writer.set_font("B", 14)
+    pdf.cell(0, 10, "Workout Details", ln=True)
+    pdf.ln(2)
+
+    for kind, text in parse_workout_markdown(workout_data['content']):
+        if kind == BLANK:
+            # Add spacing for empty lines
+            pdf.ln(5)
+            continue
+
+        writer.set_font(*PDF_FONTS[kind])
+        if kind == BULLET:
+            # The core fonts are cp1252, where the bullet is chr(149)
+            pdf.cell(5, 10, chr(149), ln=0)
+            pdf.cell(0, 10, text, ln=True)
+        elif kind == TEXT:
+            pdf.multi_cell(0, 10, text)
+        else:
+            pdf.cell(0, 10, text, ln=True)
+
+    # Footer
+    pdf.ln(10)
+    writer.set_font("I", 8)
+    pdf.cell(0, 10, f"Generated on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True, align="C")
+    pdf.cell(0, 10, "AI Fitness Trainer", ln=True, align="C")
+
+    return pdf.output(dest="S").encode("latin1")
+
+
+def create_workout_text(workout_data):
+    """Create a plain-text version of the workout without markdown markup"""
+    lines = [
+        "PERSONALIZED WORKOUT PLAN",
+        "",
+        f"Type: {workout_data['workout_type']}",
+        f"Muscle Groups: {', '.join(workout_data['muscle_group'])}",
+        f"Duration: {workout_data['duration']} minutes",
+        "",
+        "Additional Notes:",
+        workout_data['notes'],
+        "",
+    ]
+
+    for kind, text in parse_workout_markdown(workout_data['content']):
+        if kind == HEADING_1:
+            lines.extend([text.upper(), "=" * len(text)])
+        elif kind == HEADING_2:
+            lines.extend([text, "-" * len(text)])
+        elif kind == BULLET:
+            lines.append(f"  • {text}")
+        else:
+            lines.append(text)
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,77 @@
+from bisect import bisect_left, bisect_right
+
+
+class WorkoutIndex:
+    """Time-ordered index over one user's workouts with type and muscle group postings
+
+    Workouts are identified by their position in the user's workout list.
+    ``order`` holds those positions sorted by timestamp; the posting lists
+    hold ranks into ``order``, so every list stays sorted oldest first and a
+    date range is a pair of bisects.
+    """
+
+    def __init__(self, workouts=()):
+        self.order = []
+        self.timestamps = []
+        self.by_type = {}
+        self.by_muscle_group = {}
+        self.positions_by_id = {}
+
+        positions = sorted(range(len(workouts)), key=lambda i: (workouts[i]["timestamp"], i))
+        for position in positions:
+            self._append(position, workouts[position])
+
+    def __len__(self):
+        return len(self.order)
+
+    def _append(self, position, workout):
+        rank = len(self.order)
+        self.order.append(position)
+        self.timestamps.append(workout["timestamp"])
+        self.positions_by_id[workout["id"]] = position
+        data = workout["data"]
+        self.by_type.setdefault(data["workout_type"], []).append(rank)
+        for muscle_group in data.get("muscle_group", []):
+            self.by_muscle_group.setdefault(muscle_group, []).append(rank)
+
+    def add(self, position, workout):
+        """Index a newly appended workout; returns False if a rebuild is needed"""
+        if self.timestamps and workout["timestamp"] < self.timestamps[-1]:
+            return False
+        self._append(position, workout)
+        return True
+
+    def query(self, workout_type=None, muscle_group=None, start=None, end=None, offset=0, limit=20):
+        """Positions of one page of matching workouts, newest first, and the total match count
+
+        start and end are inclusive ``YYYY-MM-DD`` dates.
+        """
+        lo = bisect_left(self.timestamps, start) if start else 0
+        hi = bisect_right(self.timestamps, f"{end} 99") if end else len(self.timestamps)
+
+        postings = []
+        if workout_type:
+            postings.append(self.by_type.get(workout_type, []))
+        if muscle_group:
+            postings.append(self.by_muscle_group.get(muscle_group, []))
+
+        if not postings:
+            # Unfiltered pages are a direct slice of the time order
+            total = max(0, hi - lo)
+            first = hi - 1 - offset
+            last = max(lo - 1, first - limit)
+            return [self.order[rank] for rank in range(first, last, -1)], total
+
+        # Restrict every posting list to the date range, then intersect from the shortest
+        ranges = []
+        for ranks in postings:
+            ranges.append(ranks[bisect_left(ranks, lo):bisect_left(ranks, hi)])
+        ranges.sort(key=len)
+        matches = ranges[0]
+        for other in ranges[1:]:
+            other_set = set(other)
+            matches = [rank for rank in matches if rank in other_set]
+
+        total = len(matches)
+        page = matches[max(0, total - offset - limit):max(0, total - offset)]
+        return [self.order[rank] for rank in reversed(page)], total